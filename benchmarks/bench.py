@@ -0,0 +1,135 @@
+# Times the hot paths of the calculator over the fixed scenario grid and writes the results as JSON, so runs on
+# different commits can be compared. Run from the repository root:
+#
+#     python benchmarks/bench.py -o before.json
+#     python benchmarks/bench.py --compare before.json
+import argparse
+import importlib.util
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# scenarios puts calculator/ on the path
+from scenarios import scenarios
+from engine import (calc_damage_no_randomness, calc_offense_backwards_exact, calc_offense_histogram,
+                    calc_offense_solution, solve_offense)
+from plots import histogram_png, histogram_svg, roll_ticks
+
+calculator_dir = Path(__file__).parent.parent / "calculator"
+
+
+# the per-candidate loop the calculator used before the forward formula was batched
+def scalar_histogram(damage_received, base_power, defense, modifiers):
+    offense_min, offense_max = calc_offense_backwards_exact(damage_received, base_power, defense, modifiers)
+    counts = []
+    for offense in range(max(0, offense_min), offense_max + 1):
+        damage = calc_damage_no_randomness(offense, base_power, defense, modifiers)
+        counts.append(sum(1 for roll in range(85, 101) if damage * roll // 100 == damage_received))
+    return counts
+
+
+def batch_histogram(damage_received, base_power, defense, modifiers):
+    offense_min, offense_max = calc_offense_backwards_exact(damage_received, base_power, defense, modifiers)
+    return calc_offense_histogram(offense_min, offense_max, base_power, defense, modifiers, damage_received)
+
+
+def render(backend):
+    def run(damage_received, base_power, defense, modifiers):
+        offense, counts = calc_offense_solution(damage_received, base_power, defense, modifiers)
+        return backend(offense, counts, "Attack Value Likelihood", "ATK value", "Nr. of rolls / 16", roll_ticks)
+    return run
+
+
+# (name, function of one scenario, take every n-th scenario)
+benchmarks = [
+    ("offense_backwards_exact", calc_offense_backwards_exact, 1),
+    ("forward_loop_scalar", scalar_histogram, 1),
+    ("forward_batch", batch_histogram, 1),
+    ("solve_offense_uncached", calc_offense_solution, 1),
+    ("solve_offense_cached", solve_offense, 1),
+    ("render_svg", render(histogram_svg), 1),
+]
+# matplotlib is optional, and slow enough that a sample of the grid is plenty
+if importlib.util.find_spec("matplotlib"):
+    benchmarks.append(("render_png", render(histogram_png), 20))
+
+
+def time_benchmark(function, sample, repeat: int) -> list[float]:
+    totals = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for scenario in sample:
+            function(scenario.damage_received, scenario.base_power, scenario.defense, scenario.modifiers)
+        totals.append(time.perf_counter() - start)
+    return totals
+
+
+# wall time of a fresh interpreter importing the app, which is what a server (or Pyodide) pays on startup
+def time_import(repeat: int) -> list[float]:
+    totals = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "import app"], cwd=calculator_dir, check=True)
+        totals.append(time.perf_counter() - start)
+    return totals
+
+
+def git_commit() -> str | None:
+    result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=calculator_dir, capture_output=True,
+                            text=True)
+    return result.stdout.strip() or None
+
+
+def summarize(totals: list[float], calls: int) -> dict:
+    return {"calls": calls, "repeat": len(totals), "median_ms": statistics.median(totals) * 1000,
+            "min_ms": min(totals) * 1000, "per_call_us": statistics.median(totals) / calls * 1e6}
+
+
+def compare(results: dict, baseline: dict):
+    print(f"{'benchmark':<26}{'before us':>14}{'after us':>14}{'speedup':>10}", file=sys.stderr)
+    for name, result in results["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            print(f"{name:<26}{'-':>14}{result['per_call_us']:>14.1f}", file=sys.stderr)
+            continue
+        speedup = before["per_call_us"] / result["per_call_us"] if result["per_call_us"] else float("inf")
+        print(f"{name:<26}{before['per_call_us']:>14.1f}{result['per_call_us']:>14.1f}{speedup:>9.2f}x",
+              file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark the damage engine over a fixed scenario grid")
+    parser.add_argument("-o", "--output", help="write the JSON results here instead of stdout")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--skip-import", action="store_true", help="skip timing the app import")
+    parser.add_argument("--compare", help="JSON results of an earlier run to print speedups against")
+    args = parser.parse_args()
+
+    results = {"commit": git_commit(), "python": platform.python_version(), "numpy": np.__version__,
+               "scenarios": len(scenarios), "results": {}}
+    # fill the cache once so solve_offense_cached only measures lookups
+    for scenario in scenarios:
+        solve_offense(scenario.damage_received, scenario.base_power, scenario.defense, scenario.modifiers)
+    for name, function, every in benchmarks:
+        sample = scenarios[::every]
+        results["results"][name] = summarize(time_benchmark(function, sample, args.repeat), len(sample))
+    if not args.skip_import:
+        results["results"]["import_app"] = summarize(time_import(args.repeat), 1)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    if args.compare:
+        compare(results, json.loads(Path(args.compare).read_text()))
+
+
+if __name__ == "__main__":
+    main()
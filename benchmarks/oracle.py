@@ -0,0 +1,218 @@
+# Exhaustive forward-simulation oracle for the damage engine. For every scenario it runs the scalar formula
+# (calc_damage_no_randomness, the float floor steps the calculator started with) over every offense value a Gen 3
+# Pokemon can have and all 16 rolls, then checks that
+#   - the batched forward formula gives the same pre-roll damage for every offense value,
+#   - the exact backward bounds never cut off an offense value that can deal the damage,
+#   - solve_offense (cached and uncached) reproduces the brute-force histogram exactly,
+#   - solve_unknown reproduces the brute-force histogram of each of offense, defense, level and move power when the
+#     other three are those the damage was generated from.
+# On top of the scenarios it checks random samples of the forward tools:
+#   - calc_damage_matrix gives the damage, HP and KO chances of the scalar formula for every move and a sample of
+#     defenders of random attackers,
+#   - plan_route gives the experience and levels of a battle-by-battle loop over the experience table on every
+#     growth curve for random routes.
+# Exits with 1 on the first few mismatches. Run from the repository root:
+#
+#     python benchmarks/oracle.py [--random 500 --seed 0 --samples 50]
+import argparse
+import random
+import sys
+from math import floor
+
+import numpy as np
+
+# scenarios puts calculator/ on the path
+from scenarios import Scenario, scenarios
+from engine import (Battle, Modifiers, calc_base_power, calc_damage_matrix, calc_damage_no_randomness,
+                    calc_damage_no_randomness_batch, calc_effectiveness, calc_hp, calc_modifiers,
+                    calc_offense_backwards_exact, calc_offense_solution, calc_stat, get_move_attributes,
+                    get_weather_modifier, plan_route, solve_offense, solve_unknown)
+from engine.data import DEF, HP, NO_TYPE, SPD, STATUS, experience, growth_rates, moves, species, weather
+
+# no Gen 3 stat gets past 999, stages and abilities are applied inside the formula
+max_offense = 1023
+# values brute-forced for each input of solve_unknown
+unknown_ranges = {"offense": range(max_offense + 1), "defense": range(1, 1024), "level": range(1, 101),
+                  "power": range(1, 1024)}
+
+
+def count_rolls(pre_roll: int, damage_received: int) -> int:
+    return sum(1 for roll in range(85, 101) if floor(pre_roll * roll / 100) == damage_received)
+
+
+def brute_force_histogram(scenario: Scenario) -> tuple[list[int], dict[int, int]]:
+    damage = [calc_damage_no_randomness(offense, scenario.base_power, scenario.defense, scenario.modifiers)
+              for offense in range(max_offense + 1)]
+    counts = {}
+    for offense, pre_roll in enumerate(damage):
+        count = count_rolls(pre_roll, scenario.damage_received)
+        if count:
+            counts[offense] = count
+    return damage, counts
+
+
+def check(scenario: Scenario) -> list[str]:
+    errors = []
+    damage, expected = brute_force_histogram(scenario)
+
+    batch = calc_damage_no_randomness_batch(np.arange(max_offense + 1, dtype=np.int64), scenario.base_power,
+                                            scenario.defense, scenario.modifiers)
+    mismatched = np.flatnonzero(batch != np.array(damage))
+    if len(mismatched):
+        errors.append(f"batched forward formula differs at offense {mismatched[:5].tolist()}")
+
+    offense_min, offense_max = calc_offense_backwards_exact(scenario.damage_received, scenario.base_power,
+                                                            scenario.defense, scenario.modifiers)
+    cut_off = [offense for offense in expected if not offense_min <= offense <= offense_max]
+    if cut_off:
+        errors.append(f"bounds [{offense_min}, {offense_max}] cut off {cut_off[:5]}")
+
+    for label, solve in (("uncached", calc_offense_solution), ("cached", solve_offense)):
+        offense, counts = solve(scenario.damage_received, scenario.base_power, scenario.defense, scenario.modifiers)
+        found = {int(o): int(c) for o, c in zip(offense, counts) if c and o <= max_offense}
+        if found != expected:
+            missing = sorted(set(expected) - set(found))[:5]
+            extra = sorted(set(found) - set(expected))[:5]
+            wrong = sorted(o for o in set(found) & set(expected) if found[o] != expected[o])[:5]
+            errors.append(f"{label} solve_offense: missing {missing}, extra {extra}, wrong counts at {wrong}")
+
+    known = {"offense": scenario.offense, "defense": scenario.defense, "level": scenario.level,
+             "power": scenario.move_power}
+    for unknown, values in unknown_ranges.items():
+        expected = {}
+        for value in values:
+            inputs = {**known, unknown: value}
+            pre_roll = calc_damage_no_randomness(inputs["offense"], calc_base_power(inputs["level"], inputs["power"]),
+                                                 inputs["defense"], scenario.modifiers)
+            if count := count_rolls(pre_roll, scenario.damage_received):
+                expected[value] = count
+        solved, counts = solve_unknown(scenario.damage_received, scenario.modifiers, **{**known, unknown: None})
+        found = {v: c for v, c in zip(solved.tolist(), counts.tolist()) if c and v in values}
+        if found != expected:
+            missing = sorted(set(expected) - set(found))[:5]
+            extra = sorted(set(found) - set(expected))[:5]
+            errors.append(f"solve_unknown for {unknown}: missing {missing}, extra {extra}")
+    return errors
+
+
+# random modifier combinations outside the grid, including ones calc_modifiers never produces together
+def random_scenario(rng: random.Random, i: int) -> Scenario:
+    modifiers = Modifiers(rng.randint(-6, 6), rng.choice([1, 0.5]), rng.choice([1, 0.5]), rng.choice([1, 1.5]),
+                          rng.choice([1, 1.5, 0.5]), rng.choice([1, 0.5]), rng.choice([1, 0.5]), rng.choice([1, 2]),
+                          rng.choice([1, 2]), rng.choice([1, 1.5]), rng.choice([0.5, 1, 2]), rng.choice([0.5, 1, 2]))
+    level, move_power = rng.randint(1, 100), rng.choice([10, 20, 40, 60, 80, 95, 120, 150, 250])
+    base_power = calc_base_power(level, move_power)
+    defense = rng.randint(1, 999)
+    offense = rng.randint(1, 999)
+    pre_roll = calc_damage_no_randomness(offense, base_power, defense, modifiers)
+    damage_received = max(1, floor(pre_roll * rng.randint(85, 100) / 100))
+    return Scenario(f"random {i}", damage_received, base_power, defense, modifiers, offense, level, move_power)
+
+
+# a random attacker with up to four fixed power moves against a sample of defenders, checked one by one on the
+# scalar formula
+def check_damage_matrix(rng: random.Random) -> list[str]:
+    errors = []
+    move_ids = rng.sample([move.id for move in moves if move.category != STATUS and move.power], rng.randint(1, 4))
+    attacker = rng.choice(species)
+    attack, special_attack, level = rng.randint(5, 999), rng.randint(5, 999), rng.randint(1, 100)
+    defender_level, weather_id, offense_stage = rng.randint(1, 100), rng.randrange(len(weather)), rng.randint(-6, 6)
+    iv, evs, nature = rng.randint(0, 31), rng.randrange(0, 256, 4), rng.choice([0.9, 1.0, 1.1])
+    is_crit = rng.random() < 0.3
+    matrix = calc_damage_matrix(move_ids, attack, special_attack, level, attacker.types, defender_level, weather_id,
+                                offense_stage, iv, evs, nature, is_crit=is_crit)
+
+    for row, move_id in enumerate(matrix.move_ids):
+        move_type, move_power, is_physical = get_move_attributes(move_id, weather_id)
+        for defender in rng.sample(species, 20):
+            modifiers = calc_modifiers(move_type, is_physical, calc_effectiveness(move_type, *defender.types),
+                                       get_weather_modifier(weather_id, move_type), offense_stage,
+                                       move_type != NO_TYPE and move_type in attacker.types, is_crit=is_crit)
+            defense = int(calc_stat(defender.base_stats[DEF if is_physical else SPD], iv, evs, defender_level,
+                                    nature))
+            pre_roll = calc_damage_no_randomness(attack if is_physical else special_attack,
+                                                 calc_base_power(level, move_power), defense, modifiers)
+            damage = [floor(pre_roll * roll / 100) for roll in range(85, 101)]
+            hp = int(calc_hp(defender.base_stats[HP], iv, evs, defender_level))
+            ohko = sum(rolled >= hp for rolled in damage) / 16
+            two_hko = sum(first + second >= hp for first in damage for second in damage) / 256
+            found = (matrix.damage[row, defender.id].tolist(), int(matrix.hp[defender.id]),
+                     float(matrix.ohko[row, defender.id]), float(matrix.two_hko[row, defender.id]))
+            if found != (damage, hp, ohko, two_hko):
+                errors.append(f"damage matrix: {moves[move_id].name} against {defender.name} gives {found}, "
+                              f"expected {(damage, hp, ohko, two_hko)}")
+    return errors
+
+
+# level a total experience reaches on one growth curve, walking up the experience table
+def level_of(total: int, rate: int) -> int:
+    level, needed = 1, 0
+    while level < len(experience) and needed + int(experience[level - 1, rate]) <= total:
+        needed += int(experience[level - 1, rate])
+        level += 1
+    return level
+
+
+# a random route, checked against one battle at a time on every growth curve
+def check_route(rng: random.Random) -> list[str]:
+    party_levels = [rng.randint(1, 100) for _ in range(rng.randint(1, 6))]
+    battles = [Battle(rng.randrange(len(species)), rng.randint(1, 100), rng.random() < 0.5,
+                      tuple(sorted(rng.sample(range(len(party_levels)), rng.randint(1, len(party_levels))))))
+               for _ in range(rng.randint(1, 60))]
+    plan = plan_route(party_levels, battles)
+
+    errors = []
+    for rate in range(len(growth_rates)):
+        max_experience = sum(int(needed) for needed in experience[:-1, rate])
+        totals = [sum(int(needed) for needed in experience[:level - 1, rate]) for level in party_levels]
+        expected = [list(totals)]
+        for battle in battles:
+            gain = max(1, species[battle.species_id].exp * battle.level // 7 // len(battle.participants))
+            if battle.is_trainer:
+                gain = gain * 150 // 100
+            for member in battle.participants:
+                totals[member] = min(max_experience, totals[member] + gain)
+            expected.append(list(totals))
+        if plan.experience[:, :, rate].tolist() != expected:
+            errors.append(f"plan_route: experience on {growth_rates[rate]} differs from the battle-by-battle loop")
+        levels = [[level_of(total, rate) for total in row] for row in expected]
+        if plan.levels[:, :, rate].tolist() != levels:
+            errors.append(f"plan_route: levels on {growth_rates[rate]} differ from the battle-by-battle loop")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="check the damage engine against brute-force forward simulation")
+    parser.add_argument("--random", type=int, default=0, help="number of extra random scenarios")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--samples", type=int, default=50, help="random damage matrices and routes")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    checked = scenarios + [random_scenario(rng, i) for i in range(args.random)]
+    failures = 0
+    for scenario in checked:
+        errors = check(scenario)
+        if errors:
+            failures += 1
+            print(f"{scenario.name}: {scenario}", file=sys.stderr)
+            for error in errors:
+                print(f"    {error}", file=sys.stderr)
+            if failures >= 10:
+                break
+    print(f"{len(checked)} scenarios, {failures} failed")
+
+    failed_samples = 0
+    for check_sample in (check_damage_matrix, check_route):
+        for _ in range(args.samples):
+            errors = check_sample(rng)
+            if errors:
+                failed_samples += 1
+                for error in errors[:5]:
+                    print(f"    {error}", file=sys.stderr)
+    print(f"{args.samples} damage matrices and {args.samples} routes, {failed_samples} failed")
+    sys.exit(1 if failures or failed_samples else 0)
+
+
+if __name__ == "__main__":
+    main()
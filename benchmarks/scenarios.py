@@ -0,0 +1,61 @@
+# Fixed grid of damage scenarios shared by bench.py and oracle.py. Every scenario is built forward from a known
+# attacker, so the inverse solve always has an answer to find
+import sys
+from itertools import product
+from math import floor
+from pathlib import Path
+from typing import NamedTuple
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "calculator"))
+
+from engine import (Modifiers, calc_base_power, calc_damage_no_randomness, calc_effective_defense, calc_effectiveness,
+                    calc_modifiers, get_weather_modifier, is_type_physical)
+from engine.data import NO_TYPE, type_index, weather_index
+
+levels = [5, 15, 30, 50, 100]
+move_powers = [40, 80, 120]
+offense_stages = [-2, 0, 2]
+crits = [False, True]
+# move type, defending types, weather, further calc_modifiers flags
+setups = [
+    ("Normal", ("Normal",), "Clear", {"is_stab": True}),
+    ("Fire", ("Grass", "Steel"), "Sunny", {"has_flash_fire": True}),
+    ("Water", ("Ground", "Rock"), "Rain", {"is_stab": True}),
+    ("Fighting", ("Normal", "Flying"), "Clear", {"is_burned": True, "has_reflect_lightscreen": True}),
+    ("Electric", ("Water", "Flying"), "Clear", {"has_double_damage_or_charge": True, "has_sport": True}),
+    ("Ice", ("Grass", "Dragon"), "Hail", {"has_thick_fat": True, "is_stab": True}),
+]
+
+
+class Scenario(NamedTuple):
+    name: str
+    damage_received: int
+    base_power: int
+    defense: int
+    modifiers: Modifiers
+    # the attacker the damage was generated from
+    offense: int
+    level: int
+    move_power: int
+
+
+def build_scenario(level: int, move_power: int, offense_stage: int, is_crit: bool, setup: tuple) -> Scenario:
+    move_type_name, defending_type_names, weather_name, flags = setup
+    move_type = type_index[move_type_name]
+    defending_types = [type_index[name] for name in defending_type_names] + [NO_TYPE]
+    modifiers = calc_modifiers(move_type, is_type_physical(move_type),
+                               calc_effectiveness(move_type, defending_types[0], defending_types[1]),
+                               get_weather_modifier(weather_index[weather_name], move_type),
+                               offense_stage=offense_stage, is_crit=is_crit, **flags)
+    base_power = calc_base_power(level, move_power)
+    # roughly level-appropriate stats on both sides, defense with a badge and one stage up
+    offense = 2 * level + 10
+    defense = calc_effective_defense(2 * level + 5, True, 1, is_crit)
+    # a middle roll
+    damage_received = max(1, floor(calc_damage_no_randomness(offense, base_power, defense, modifiers) * 92 / 100))
+    name = (f"L{level} {move_type_name} {move_power} vs {'/'.join(defending_type_names)} {weather_name} "
+            f"stage {offense_stage:+d}{' crit' if is_crit else ''}")
+    return Scenario(name, damage_received, base_power, defense, modifiers, offense, level, move_power)
+
+
+scenarios = [build_scenario(*values) for values in product(levels, move_powers, offense_stages, crits, setups)]
@@ -1,16 +1,34 @@
-from math import floor, ceil, isnan
+import asyncio
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
 import numpy as np
-import matplotlib.pyplot as plt
-import pandas as pd
 from shiny.types import SilentException
 
 # Load data and compute static values
-from shared import app_dir, pokemons, types, moves, type_priority, experience, weather, question_circle_fill
-
+from shared import (app_dir, species, pokemon_names, pokemon_index, moves, move_names, move_index, type_priority,
+                    type_index, weather, weather_index, growth_rates, NO_TYPE, STATUS, question_circle_fill)
+from engine import (SOLVE_CHUNK_SIZE, Battle, Modifiers, StatPosterior, add_observation, calc_base_power,
+                    calc_damage_matrix, calc_effective_defense, calc_effectiveness, calc_modifiers,
+                    calc_offense_backwards_exact, calc_posterior, iter_offense_histogram, merge_histograms,
+                    get_move_attributes, get_pokemon_types, get_weather_modifier, infer_stat_spread, is_type_physical,
+                    ivs, plan_route, rank_species, search_moves, solve_offense, solve_offense_cache_stats, ATK, SPA)
+
+import diagnostics
+from diagnostics import count, count_invalidations, timed
+from plots import histogram, roll_ticks
 from shiny import App, Inputs, Outputs, Session, reactive, render, ui, render_plot, render_ui, req
 
 
+# the tables of every output: a header row, then one row of cells per entry of rows
+def table(header: list[str], rows) -> ui.Tag:
+    return ui.tags.table(ui.tags.thead(ui.tags.tr(*(ui.tags.th(name) for name in header))),
+                         ui.tags.tbody(*(ui.tags.tr(*(ui.tags.td(cell) for cell in row)) for row in rows)),
+                         class_="table table-sm")
+
+
 def simplified_page():
     return ui.nav_panel(
         "Simplified",
@@ -24,7 +42,7 @@ def simplified_page():
                 ui.input_numeric("damage_received_simplified", "DMG Taken:", 5, min=1, max=999),
             ),
             ui.page_fluid(
-                ui.output_plot("calculate_offense_simplified"),
+                ui.output_ui("calculate_offense_simplified"),
             ),
             col_widths=(2, 10),
         )
@@ -48,11 +66,11 @@ def advanced_page():
                                     ui.nav_spacer(),
                                     ui.nav_panel("Pokemon",
                                                  ui.input_selectize("own_pokemon", "Select Pokemon:",
-                                                                    sorted(pokemons.index)),
+                                                                    sorted(pokemon_names)),
                                                  ),
                                     ui.nav_panel("Type",
                                                  ui.input_selectize("types", "Select types:",
-                                                                    sorted(types.index), multiple=True)
+                                                                    sorted(type_priority), multiple=True)
                                                  ),
                                     title=ui.tooltip(
                                         ui.span("Typing by:   ", question_circle_fill),
@@ -72,7 +90,7 @@ def advanced_page():
                                 ui.nav_spacer(),
                                 ui.nav_panel("Name",
                                              ui.input_selectize("enemy_move", "Move Name",
-                                                                choices=sorted(moves.index)),
+                                                                choices=sorted(move_names)),
                                              ),
                                 ui.nav_panel("Power + Type",
                                              ui.layout_columns(
@@ -80,10 +98,19 @@ def advanced_page():
                                                                   value=40,
                                                                   step=5, max=999),
                                                  ui.input_selectize("enemy_move_type", "Move Type",
-                                                                    choices=sorted(types.index),
+                                                                    choices=sorted(type_priority),
                                                                     selected="Normal"),
                                              ),
                                              ),
+                                ui.nav_panel("Unknown",
+                                             ui.p("Ranks every damaging move by how well it explains the damage "
+                                                  "taken, with and without STAB. Physical moves hit DEF and "
+                                                  "special moves SPD, both with the DEF/SPD badge and stage."),
+                                             ui.layout_columns(
+                                                 ui.input_numeric("search_def", "DEF:", 20, min=1, max=999),
+                                                 ui.input_numeric("search_spd", "SPD:", 20, min=1, max=999),
+                                             ),
+                                             ),
                                 title=ui.tooltip(
                                     ui.span("Move by:   ", question_circle_fill),
                                     "Select the move used by the opponent",
@@ -146,7 +173,20 @@ def advanced_page():
                     ),
                 ),
                 ui.page_fluid(
-                    ui.output_plot("calculate_offense_advanced"),
+                    ui.output_ui("calculate_offense_advanced"),
+                    ui.output_ui("move_search"),
+                    ui.layout_columns(
+                        ui.input_action_button("add_observation", "Log this hit"),
+                        ui.input_action_button("clear_observations", "Clear log"),
+                    ),
+                    ui.output_ui("observation_log"),
+                    ui.output_ui("observation_posterior"),
+                    ui.layout_columns(
+                        ui.input_selectize("enemy_pokemon", "Enemy Pokemon:", [""] + sorted(pokemon_names)),
+                        ui.input_numeric("enemy_max_evs", "Max EVs in the stat:", 0, min=0, max=255, step=4),
+                    ),
+                    ui.output_ui("stat_spread"),
+                    ui.output_ui("species_candidates"),
                 ),
                 col_widths=(6, 6),
             ),
@@ -155,322 +195,637 @@ def advanced_page():
     )
 
 
+# the forward direction: an attacker's moves against every species
+def damage_matrix_page():
+    damaging_moves = sorted(move.name for move in moves if move.category != STATUS and move.power)
+    return ui.nav_panel(
+        "Damage Matrix",
+        ui.layout_columns(
+            ui.page_fluid(
+                ui.h3("Attacker"),
+                ui.input_selectize("matrix_pokemon", "Pokemon (for STAB):", [""] + sorted(pokemon_names)),
+                ui.input_selectize("matrix_moves", "Moves:", damaging_moves, multiple=True,
+                                   options={"maxItems": 4}),
+                ui.layout_columns(
+                    ui.input_numeric("matrix_level", "Level:", 50, min=1, max=100),
+                    ui.input_numeric("matrix_stage", "ATK/SPA Stage:", 0, min=-6, max=6),
+                ),
+                ui.layout_columns(
+                    ui.input_numeric("matrix_attack", "ATK:", 100, min=1, max=999),
+                    ui.input_numeric("matrix_special_attack", "SPA:", 100, min=1, max=999),
+                ),
+                ui.input_select("matrix_weather", "Weather:", weather, selected="Clear"),
+                ui.input_switch("matrix_crit", "CRIT"),
+                ui.h3("Defenders"),
+                ui.input_numeric("matrix_defender_level", "Level:", 50, min=1, max=100),
+                ui.layout_columns(
+                    ui.input_numeric("matrix_iv", "IVs:", 31, min=0, max=31),
+                    ui.input_numeric("matrix_evs", "EVs:", 0, min=0, max=255, step=4),
+                ),
+            ),
+            ui.page_fluid(
+                ui.layout_columns(
+                    ui.input_select("matrix_sort", "Sort by:", ["2HKO chance", "OHKO chance", "Max damage",
+                                                               "Dex number", "Name"]),
+                    ui.input_text("matrix_filter", "Pokemon name contains:"),
+                    ui.input_selectize("matrix_type", "Defender type:", [""] + sorted(type_priority)),
+                ),
+                ui.output_ui("damage_matrix"),
+            ),
+            col_widths=(3, 9),
+        ),
+    )
+
+
+# rows of the damage matrix table, the full matrix has a row for every species and move
+matrix_rows = 100
+
+
+# a route of planned battles, one per line: the party members that take part are numbered from 1 in party order
+def exp_planner_page():
+    return ui.nav_panel(
+        "EXP Planner",
+        ui.layout_columns(
+            ui.page_fluid(
+                ui.h3("Route"),
+                ui.input_text("planner_party", "Party levels, in party order:", "5"),
+                ui.input_text_area("planner_battles", "Battles, one per line: Pokemon, level, trainer or wild, "
+                                                      "party members that take part (default 1)",
+                                   "Poochyena, 2, wild\nZigzagoon, 3, wild\nPoochyena, 5, trainer",
+                                   rows=15, width="100%"),
+                ui.input_select("planner_growth_rate", "Growth rate:", growth_rates, selected="Medium Fast"),
+            ),
+            ui.page_fluid(
+                ui.output_ui("exp_plan"),
+            ),
+            col_widths=(4, 8),
+        ),
+    )
+
+
+# "Zigzagoon, 3, wild" or "Poochyena, 5, trainer, 1 2" as a Battle, raises ValueError with a readable message
+def parse_battle(line: str, party_size: int) -> Battle:
+    fields = [field.strip() for field in line.split(",")]
+    if len(fields) not in (3, 4):
+        raise ValueError("expected Pokemon, level, trainer or wild and optionally the party members")
+    name, level, kind = fields[:3]
+    if name not in pokemon_index:
+        raise ValueError(f"unknown Pokemon {name}")
+    if not level.isdigit() or not 1 <= int(level) <= 100:
+        raise ValueError(f"level {level} is not between 1 and 100")
+    if kind.lower() not in ("trainer", "wild"):
+        raise ValueError(f"{kind} is neither trainer nor wild")
+    members = fields[3].split() if len(fields) == 4 else ["1"]
+    if not members or not all(member.isdigit() and 1 <= int(member) <= party_size for member in members):
+        raise ValueError(f"party members have to be numbers from 1 to {party_size}")
+    return Battle(pokemon_index[name], int(level), kind.lower() == "trainer",
+                  tuple(sorted({int(member) - 1 for member in members})))
+
+
+# only part of the app with GEN3_CALCULATOR_DIAGNOSTICS=1, see diagnostics.py
+def diagnostics_page():
+    return ui.nav_panel(
+        "Diagnostics",
+        ui.output_ui("diagnostics_panel"),
+    )
+
+
 app_ui = \
     ui.page_navbar(
         ui.nav_spacer(),
         simplified_page(),
         advanced_page(),
+        damage_matrix_page(),
+        exp_planner_page(),
+        *([diagnostics_page()] if diagnostics.enabled else []),
         id="mode",
         title="Pokemon Generation 3 Calculator",
         window_title="Gen 3 Calculator",
     )
 
 
+# numeric inputs fire on every keystroke (typing "125" sends 1, 12 and 125), so they only reach the calculation
+# once they have stayed unchanged for delay seconds
+def debounce(input_value, delay: float = 0.4):
+    with reactive.isolate():
+        value = input_value()
+    settled = reactive.value(value)
+    pending = {"value": value, "since": 0.0}
+
+    @reactive.effect
+    def _():
+        value = input_value()
+        now = time.monotonic()
+        if value != pending["value"]:
+            pending["value"], pending["since"] = value, now
+        if now - pending["since"] < delay:
+            reactive.invalidate_later(delay - (now - pending["since"]))
+        else:
+            with reactive.isolate():
+                if settled.get() != value:
+                    settled.set(value)
+
+    return settled.get
+
+
+# heavy solves run on these threads so they never block the event loop all sessions share. Pyodide has no threads,
+# there they run inline and only yield to the event loop between steps
+solve_pool = None if sys.platform == "emscripten" else ThreadPoolExecutor(max_workers=2)
+
+
+async def run_in_background(function, *args, **kwargs):
+    if solve_pool is None:
+        await asyncio.sleep(0)
+        return function(*args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(solve_pool, partial(function, *args, **kwargs))
+
+
+# solve_offense for candidate ranges of any size: small ones are answered right away from the cache, large ones are
+# scanned chunk by chunk in the background with a progress bar, and can be cancelled between chunks
+async def solve_offense_in_background(damage_received: int, base_power: int, defense: int, modifiers: Modifiers):
+    with timed("bounds"):
+        offense_min, offense_max = calc_offense_backwards_exact(damage_received, base_power, defense, modifiers)
+    candidates = max(0, offense_max - max(0, offense_min) + 1)
+    with timed("candidates", scanned=candidates) as found:
+        if candidates <= SOLVE_CHUNK_SIZE:
+            offense, counts = solve_offense(damage_received, base_power, defense, modifiers)
+        else:
+            chunks = iter_offense_histogram(offense_min, offense_max, base_power, defense, modifiers,
+                                            damage_received)
+            parts = []
+            with ui.Progress(min=0, max=candidates) as progress:
+                progress.set(0, message=f"Checking {candidates:,} candidates")
+                while (part := await run_in_background(next, chunks, None)) is not None:
+                    parts.append(part)
+                    progress.set(min(candidates, len(parts) * SOLVE_CHUNK_SIZE))
+            offense, counts = merge_histograms(parts)
+        found["matched"] = int((counts > 0).sum())
+    count("candidates_scanned", candidates)
+    count("candidates_matched", found["matched"])
+    return offense, counts
+
+
+# runs solve(*arguments()) as an extended task whenever the arguments change and cancels the run they supersede.
+# The returned calc gives the result for the current arguments, until it is there outputs show as recalculating
+def background_calc(arguments, solve):
+    @reactive.extended_task
+    async def task(args):
+        return args, await solve(*args)
+
+    invoked = {"arguments": None}
+
+    # an effect that raises ends the session, so incomplete or bad arguments only cancel the run here and result()
+    # raises the same error into the outputs
+    @reactive.effect
+    def _():
+        try:
+            args = arguments()
+        except Exception:
+            task.cancel()
+            invoked["arguments"] = None
+            return
+        if args != invoked["arguments"]:
+            invoked["arguments"] = args
+            task.cancel()
+            task.invoke(args)
+
+    @reactive.calc
+    def result():
+        args = arguments()
+        solved_args, value = task.result()
+        if solved_args != args:
+            req(False, cancel_output="progress")
+        return value
+
+    return result
+
+
 def server(input: Inputs, output: Outputs, session: Session):
-    @render.plot
+    enemy_level_simplified = debounce(input.enemy_level_simplified)
+    move_power_simplified = debounce(input.move_power_simplified)
+    own_defense_simplified = debounce(input.own_defense_simplified)
+    damage_received_simplified = debounce(input.damage_received_simplified)
+
+    @reactive.calc
+    def simplified_arguments():
+        with timed("resolve_inputs", tab="simplified"):
+            if not (enemy_level_simplified() and move_power_simplified() and own_defense_simplified()
+                    and damage_received_simplified()):
+                raise SilentException()
+            enemy_level = int(enemy_level_simplified())
+            move_power = int(move_power_simplified())
+            own_defense = int(own_defense_simplified())
+            damage_received = int(damage_received_simplified())
+
+            return damage_received, calc_base_power(enemy_level, move_power), own_defense, Modifiers()
+
+    offense_simplified = background_calc(simplified_arguments, solve_offense_in_background)
+
+    @render.ui
+    @count_invalidations
     def calculate_offense_simplified():
-        fig, ax = plt.subplots()
-        ax.set_title("Attack Value Likelihood")
-        ax.set_ylabel("Nr. of rolls / 16")
-        ax.set_xlabel("ATK value")
-        dmg = []
-        enemy_level = int(input.enemy_level_simplified())
-        move_power = int(input.move_power_simplified())
-        own_defense = int(input.own_defense_simplified())
-        damage_received = int(input.damage_received_simplified())
-
-        min_offense_guess = max(1, int(floor(
-            ((damage_received - 2) * 50) * own_defense / move_power / floor(enemy_level * 2 / 5 + 2))) - 3)
-
-        max_offense_guess = min(600, int(ceil((ceil(
-            (ceil(damage_received / 0.75) - 2) * 50 + 49) * own_defense + own_defense - 1) / move_power / floor(
-            enemy_level * 2 / 5 + 2))) + 3)
-
-        min_offense = -1
-        max_offense = -1
-
-        for x in range(min_offense_guess, max_offense_guess + 1):
-            dmg.append(0)
-            dmg100 = floor(floor(floor(enemy_level * 2 / 5 + 2) * move_power * x / own_defense) / 50 + 2)
-            for y in range(16):
-                if floor(dmg100 * (y + 85) / 100) == damage_received:
-                    dmg[x - min_offense_guess] += 1
-                    max_offense = x
-                    if min_offense == -1:
-                        min_offense = x
-
-        dmg = dmg[(min_offense - min_offense_guess): (max_offense - min_offense_guess + 1)]
-
-        ax.set_yticks([0, 2, 4, 6, 8, 10, 12, 14, 16], labels=["0", "2", "4", "6", "8", "10", "12", "14", "16"])
-        ax.set_ylim(0, 16)
-        ax.set_xticks(range(min_offense, max_offense + 1))
-        ax.bar(range(min_offense, max_offense + 1), dmg)
-        return fig
-
-    @render.plot
-    def calculate_offense_advanced():
-        fig, ax = plt.subplots()
-        ax.set_title("Attack Value Likelihood")
-        ax.set_ylabel("Nr. of rolls / 16")
-        ax.set_xlabel("ATK value")
-        dmg = []
-
-        type1 = ""
-        type2 = ""
+        offense, dmg = offense_simplified()
+        return ui.HTML(histogram(offense, dmg, "Attack Value Likelihood", "ATK value", "Nr. of rolls / 16",
+                                 roll_ticks))
+
+    # the advanced calculation is split into stages that each only invalidate when their own inputs change:
+    # typing / move resolution -> modifier bundle -> cached histogram -> plot
+    def_spd = debounce(input.def_spd)
+    def_spd_stage = debounce(input.def_spd_stage)
+    dmg_received_advanced = debounce(input.dmg_received_advanced)
+    enemy_level_advanced = debounce(input.enemy_level_advanced)
+    enemy_move_power = debounce(input.enemy_move_power)
+    atk_spa_stage = debounce(input.atk_spa_stage)
+    search_def = debounce(input.search_def)
+    search_spd = debounce(input.search_spd)
+
+    @reactive.calc
+    def defending_types():
+        type1 = NO_TYPE
+        type2 = NO_TYPE
         if input.input_type_type() == "Pokemon":
-            own_pokemon = input.own_pokemon()
+            own_pokemon = pokemon_index[input.own_pokemon()]
             type1, type2 = get_pokemon_types(own_pokemon)
         elif input.input_type_type() == "Type":
-            type1 = "" if len(input.types()) == 0 else input.types()[0]
-            type2 = "" if len(input.types()) <= 1 else input.types()[1]
+            type1 = NO_TYPE if len(input.types()) == 0 else type_index[input.types()[0]]
+            type2 = NO_TYPE if len(input.types()) <= 1 else type_index[input.types()[1]]
+        return type1, type2
 
-        move_type = ""
+    @reactive.calc
+    def enemy_move_attributes():
+        move_type = NO_TYPE
         move_power = 0
         is_physical = False
+        move_name = ""
 
-        current_weather = input.weather()
+        current_weather = weather_index[input.weather()]
         if input.enemy_move_selection_type() == "Name":
             if not input.enemy_move():
                 raise SilentException()
-            enemy_move = input.enemy_move()
-            if moves["Category"][enemy_move] == "Status":
+            enemy_move = move_index[input.enemy_move()]
+            if moves[enemy_move].category == STATUS:
                 raise SilentException()
             move_type, move_power, is_physical = get_move_attributes(enemy_move, current_weather)
+            # variable power moves
+            if not move_power:
+                raise SilentException()
+            move_name = moves[enemy_move].name
         elif input.enemy_move_selection_type() == "Power + Type":
-            if not input.enemy_move_power():
+            if not enemy_move_power():
                 raise SilentException()
-            move_power = int(input.enemy_move_power())
+            move_power = int(enemy_move_power())
             if not input.enemy_move_type():
                 raise SilentException()
-            move_type = input.enemy_move_type()
-            is_physical = is_type_physical(type_priority.index(move_type))
-
-        weather_modifier = get_weather_modifier(current_weather, move_type)
-        eff1, eff2 = calc_effectiveness(move_type, type1, type2)
-
-        if not input.def_spd():
-            raise SilentException()
-        own_defense = int(input.def_spd())
-        has_def_spd_badge = input.def_spd_badge()
-        if not input.enemy_level_advanced():
+            move_type = type_index[input.enemy_move_type()]
+            is_physical = is_type_physical(move_type)
+            move_name = f"{type_priority[move_type]} {move_power}"
+        else:
+            # the move search ranks all moves instead
             raise SilentException()
-        enemy_level_advanced = int(input.enemy_level_advanced())
+        return move_type, move_power, is_physical, move_name
 
-        has_thick_fat = input.thick_fat()
-        thick_fat_modifier = 1 if not has_thick_fat or (
-                    has_thick_fat and not (move_type == "Ice" or move_type == "Fire")) else 0.5
+    # the calc_modifiers arguments that do not depend on the move
+    @reactive.calc
+    def modifier_flags():
+        if not (atk_spa_stage() or atk_spa_stage() == 0):
+            raise SilentException()
+        return dict(
+            offense_stage=int(atk_spa_stage()), is_crit=input.crit(), is_burned=input.burned(),
+            has_flash_fire=input.ff_active(), has_double_damage_or_charge=input.dd_charge(),
+            has_reflect_lightscreen=input.reflect_lightscreen(), has_thick_fat=input.thick_fat(),
+            has_sport=input.mud_or_water_sport(),
+        )
 
-        has_sport = input.mud_or_water_sport()
-        sport_modifier = 1 if not has_sport or (
-                    has_sport and not (move_type == "Electric" or move_type == "Fire")) else 0.5
+    @reactive.calc
+    def attack_modifiers():
+        move_type, _, is_physical, _ = enemy_move_attributes()
+        type1, type2 = defending_types()
 
-        is_stab = input.enemy_stab()
-        stab_modifier = 1.5 if is_stab else 1
+        return calc_modifiers(
+            move_type, is_physical, calc_effectiveness(move_type, type1, type2),
+            get_weather_modifier(weather_index[input.weather()], move_type), is_stab=input.enemy_stab(),
+            **modifier_flags(),
+        )
 
-        is_crit = input.crit()
-        crit_modifier = 2 if is_crit else 1
-        if not (input.atk_spa_stage() or input.atk_spa_stage() == 0):
+    # DEF/SPD after the badge and stage, for the DEF/SPD field and the DEF and SPD of the move search
+    def effective_defense(value):
+        if not value:
+            raise SilentException()
+        if not (def_spd_stage() or def_spd_stage() == 0):
             raise SilentException()
-        atk_spa_stage = int(input.atk_spa_stage())
-        applied_atk_spa_stage = 0 if (is_crit and atk_spa_stage < 0) else atk_spa_stage
+        return calc_effective_defense(int(value), input.def_spd_badge(), int(def_spd_stage()), input.crit())
 
-        if not (input.def_spd_stage() or input.def_spd_stage() == 0):
+    @reactive.calc
+    def effective_def_spd():
+        return effective_defense(def_spd())
+
+    @reactive.calc
+    def base_power():
+        _, move_power, _, _ = enemy_move_attributes()
+        if not enemy_level_advanced():
             raise SilentException()
-        def_spd_stage = int(input.def_spd_stage())
-        applied_def_spd_stage = 0 if (is_crit and def_spd_stage > 0) else def_spd_stage
-        effective_def_spd = calc_defensive_stat_modifiers(own_defense, has_def_spd_badge, applied_def_spd_stage)
+        return calc_base_power(int(enemy_level_advanced()), move_power)
 
-        has_reflect_lightscreen = input.reflect_lightscreen()
-        reflect_lightscreen_modifier = 1 if (is_crit or not has_reflect_lightscreen) else 0.5
+    # resolving the inputs includes the typing, move and modifier calcs above whenever they were invalidated
+    @reactive.calc
+    def advanced_arguments():
+        with timed("resolve_inputs", tab="advanced"):
+            if not dmg_received_advanced():
+                raise SilentException()
+            return int(dmg_received_advanced()), base_power(), effective_def_spd(), attack_modifiers()
 
-        is_burned = input.burned()
-        burned_modifier = 0.5 if (is_burned and is_physical) else 1
+    advanced_histogram = background_calc(advanced_arguments, solve_offense_in_background)
 
-        ff_active = input.ff_active()
-        ff_modifier = 1.5 if (ff_active and move_type == "Fire") else 1
+    @reactive.calc
+    def offense_advanced():
+        damage_received = advanced_arguments()[0]
+        offense, dmg = advanced_histogram()
 
-        has_double_damage_or_charge = input.dd_charge()
-        double_damage_or_charge_modifier = 2 if has_double_damage_or_charge else 1
+        move_type, _, is_physical, move_name = enemy_move_attributes()
+        level = int(enemy_level_advanced())
+        description = f"level {level} {move_name}: {damage_received} DMG{' (crit)' if input.crit() else ''}"
+        return offense, dmg, is_physical, description, level, move_type if input.enemy_stab() else NO_TYPE
 
-        if not input.dmg_received_advanced():
+    @render.ui
+    @count_invalidations
+    def calculate_offense_advanced():
+        offense, dmg, *_ = offense_advanced()
+        return ui.HTML(histogram(offense, dmg, "Attack Value Likelihood", "ATK value", "Nr. of rolls / 16",
+                                 roll_ticks))
+
+    @reactive.calc
+    def search_arguments():
+        if input.enemy_move_selection_type() != "Unknown":
+            raise SilentException()
+        if not dmg_received_advanced() or not enemy_level_advanced():
             raise SilentException()
-        damage_received = int(input.dmg_received_advanced())
-
-        min_offense_guess, max_offense_guess = calc_offense_backwards(
-            damage_received, is_physical,
-            [eff2, eff1, stab_modifier, double_damage_or_charge_modifier, crit_modifier],
-            [ff_modifier, weather_modifier,
-             reflect_lightscreen_modifier, burned_modifier],
-            effective_def_spd,
-            calc_base_power(enemy_level_advanced, move_power), applied_atk_spa_stage, sport_modifier, thick_fat_modifier
+        return (int(dmg_received_advanced()), int(enemy_level_advanced()), effective_defense(search_def()),
+                effective_defense(search_spd()), defending_types(), weather_index[input.weather()], modifier_flags())
+
+    async def search_moves_in_background(damage_received, level, defense, special_defense, types, weather_id, flags):
+        with timed("move_search") as found:
+            matches = await run_in_background(search_moves, damage_received, level, defense, special_defense, types,
+                                              weather_id, **flags)
+            found["matched"] = len(matches)
+        return matches
+
+    move_matches = background_calc(search_arguments, search_moves_in_background)
+
+    @render.ui
+    @count_invalidations
+    def move_search():
+        matches = move_matches()
+        if not matches:
+            return ui.p("No damaging move can deal this damage.")
+        rows = [(
+            moves[match.move_id].name,
+            type_priority[match.move_type] if match.move_type != NO_TYPE else "-",
+            match.move_power,
+            "Physical" if match.is_physical else "Special",
+            "yes" if match.is_stab else "",
+            f"{match.offense_min} - {match.offense_max}",
+            f"{match.share:.1%}",
+        ) for match in matches[:30]]
+        return ui.TagList(
+            ui.h5(f"{len(matches)} moves fit, the 30 most likely:" if len(matches) > 30 else
+                  f"{len(matches)} moves fit:"),
+            table(["Move", "Type", "Power", "Category", "STAB", "ATK/SPA", "Likelihood"], rows),
         )
 
-        min_offense = -1
-        max_offense = -1
-
-        base_power = calc_base_power(enemy_level_advanced, move_power)
-
-        for x in range(min_offense_guess, max_offense_guess + 1):
-            dmg.append(0)
-            full_damage = floor(floor(
-                base_power * calc_stat_stages(floor(floor(x * thick_fat_modifier) * sport_modifier),
-                                              applied_atk_spa_stage)
-                / effective_def_spd) / 50)
-            full_damage = calc_ibm_damage(int(full_damage), burned_modifier,
-                                          reflect_lightscreen_modifier, weather_modifier, ff_modifier)
-            full_damage = calc_obm_damage_no_randomness(full_damage, crit_modifier,
-                                                        double_damage_or_charge_modifier, stab_modifier, eff1, eff2)
-
-            for y in range(16):
-                if floor(full_damage * (y + 85) / 100) == damage_received:
-                    dmg[x - min_offense_guess] += 1
-                    max_offense = x
-                    if min_offense == -1:
-                        min_offense = x
-
-        dmg = dmg[(min_offense - min_offense_guess): (max_offense - min_offense_guess + 1)]
-
-        ax.set_yticks([0, 2, 4, 6, 8, 10, 12, 14, 16], labels=["0", "2", "4", "6", "8", "10", "12", "14", "16"])
-        ax.set_ylim(0, 16)
-        if max_offense - min_offense < 20:
-            ax.set_xticks(range(min_offense, max_offense + 1))
-        ax.bar(range(min_offense, max_offense + 1), dmg)
-        if not fig:
+    # one posterior per stat, physical hits narrow down ATK and special hits SPA. Each keeps the level and STAB types
+    # of its own hits, so changing the inputs after logging does not change what the outputs below infer from them
+    stat_posteriors = reactive.value({"ATK": StatPosterior(), "SPA": StatPosterior()})
+
+    @reactive.effect
+    @reactive.event(input.add_observation)
+    def log_observation():
+        offense, dmg, is_physical, description, level, stab_type = offense_advanced()
+        stat = "ATK" if is_physical else "SPA"
+        posteriors = dict(stat_posteriors.get())
+        posteriors[stat] = add_observation(posteriors[stat], offense, dmg, description, level, stab_type)
+        stat_posteriors.set(posteriors)
+
+    @reactive.effect
+    @reactive.event(input.clear_observations)
+    def clear_observations():
+        stat_posteriors.set({"ATK": StatPosterior(), "SPA": StatPosterior()})
+
+    @render.ui
+    @count_invalidations
+    def observation_log():
+        return ui.tags.ul(*[ui.tags.li(f"{stat}: {hit}")
+                            for stat, posterior in stat_posteriors.get().items() for hit in posterior.hits])
+
+    @render.ui
+    @count_invalidations
+    def observation_posterior():
+        logged = {stat: posterior for stat, posterior in stat_posteriors.get().items() if posterior.hits}
+        if not logged:
             raise SilentException()
-        return fig
-
-    def is_type_physical(type_number: int):
-        return type_number in [0, 6, 7, 8, 9, 11, 12, 13, 16]
-
-    def get_move_attributes(enemy_move, current_weather):
-        move_power = int(moves["Power"][enemy_move])
-        move_type = moves["Type"][enemy_move]
-        if enemy_move == "Weather Ball":
-            if current_weather != "Clear":
-                move_power = 100
-                if current_weather == "Sunny": move_type = "Fire"
-                if current_weather == "Sandstorm": move_type = "Rock"
-                if current_weather == "Hail": move_type = "Ice"
-                if current_weather == "Rain": move_type = "Water"
-            else:
-                move_power = 50
-        elif enemy_move == "Solarbeam":
-            if current_weather is not ("Clear" or "Sunny"): move_power = floor(move_power / 2)
-
-        is_physical = is_type_physical(move_type) == "Physical"
-        return move_type, move_power, is_physical
-
-    # ibm = "inside bracket modifier", the modifiers before the +2 in the formula
-    # obm = "outside bracket modifier", the modifiers after the +2 in the formula
-    # see https://bulbapedia.bulbagarden.net/wiki/Damage#Generation_III
-    def calc_offense_backwards(dmg_dealt: int, is_physical: bool, obm: list, ibm: list, defense: int, base_power: int,
-                               offense_stage: int, sport_modifier: float, thick_fat_modifier: float):
-        offense_guess_min = dmg_dealt
-        offense_guess_max = ceil(dmg_dealt / 0.85) + 1
-        for factor in obm:
-            offense_guess_min = floor(offense_guess_min / factor)
-            offense_guess_max = floor(offense_guess_max / factor) + (0 if factor == 1 else 1)
-
-        offense_guess_min = offense_guess_min - 2
-        offense_guess_max = offense_guess_max - 2
-
-        # physical moves always deal at least 1 dmg at this point in the calculation
-        if offense_guess_min < 1 and is_physical:
-            offense_guess_min = 0
-
-        for factor in ibm:
-            offense_guess_min = floor(offense_guess_min / factor)
-            offense_guess_max = floor(offense_guess_max / factor) + (0 if factor == 1 else 1)
-
-        offense_guess_min = floor(floor(calc_stat_stages_backwards(floor(int(offense_guess_min * 50 * defense)
-                                                                         / int(base_power)), offense_stage)[
-                                            0] / sport_modifier) / thick_fat_modifier)
-        offense_guess_max = floor(
-            floor(calc_stat_stages_backwards(floor(int((offense_guess_max * 50 + 49) * defense + defense - 1)
-                                                   / int(base_power)), offense_stage)[
-                      1] / sport_modifier + 1) / thick_fat_modifier + 1)
-
-        return offense_guess_min, offense_guess_max
-
-    def calc_ibm_damage(base_damage: int, burned_modifier: float, barrier_lightscreen_modifier: float,
-                        current_weather_modifier: float, flash_fire_modifier: float):
-        result = floor(floor(
-            floor(floor(base_damage * flash_fire_modifier) * current_weather_modifier)
-            * barrier_lightscreen_modifier) * burned_modifier)
-        return result + 2
-
-    def calc_obm_damage_no_randomness(base_damage: int, crit_modifier: int, double_damage_charge_modifier: int,
-                                      stab_modifier: float,
-                                      effectiveness_type_1: float, effectiveness_type_2: float):
-        result = floor(base_damage * crit_modifier * double_damage_charge_modifier * stab_modifier)
-        result = floor(floor(result * effectiveness_type_1) * effectiveness_type_2)
-        return result
-
-    def calc_stat_stages_backwards(stat: int, stages: int):
-        original_stat = stat / (2 + (stages if stages > 0 else 0)) * (2 - (stages if stages < 0 else 0))
-        if stages < 0:
-            result = ceil(original_stat)
-            return result, result - ceil(stages / 2)
-        else:
-            result = floor(original_stat)
-            return result, result
-
-    def calc_defensive_stat_modifiers(stat: int, defensive_badge: bool, defensive_stage: int):
-        result = stat
-        if defensive_badge:
-            result = floor(stat * 1.1)
-        result = calc_stat_stages(result, defensive_stage)
-        return result
-
-    def get_pokemon_types(pokemon):
-        return pokemons["Type 1"][pokemon], pokemons["Type 2"][pokemon]
+        plots = []
+        for stat, posterior in logged.items():
+            offense, probability = calc_posterior(posterior)
+            plots.append(ui.HTML(histogram(offense, probability, f"{stat} after {len(posterior.hits)} hits",
+                                           f"{stat} value", "Probability")))
+        return ui.layout_columns(*plots)
+
+    enemy_max_evs = debounce(input.enemy_max_evs)
+
+    # nature / IV / EV posterior of the enemy species for every stat with logged hits
+    @render.ui
+    @count_invalidations
+    def stat_spread():
+        if not input.enemy_pokemon():
+            raise SilentException()
+        logged = {stat: posterior for stat, posterior in stat_posteriors.get().items() if posterior.hits}
+        if not logged:
+            return ui.p("Log a hit to infer the nature, IVs and EVs.")
+        enemy = species[pokemon_index[input.enemy_pokemon()]]
+        max_evs = min(255, int(enemy_max_evs() or 0))
+
+        parts = []
+        for stat, posterior in logged.items():
+            level = posterior.level
+            offense, probability = calc_posterior(posterior)
+            spread = infer_stat_spread(enemy.base_stats[ATK if stat == "ATK" else SPA], level, offense, probability,
+                                       max_evs)
+            if not spread.evidence:
+                parts.append(ui.p(f"No nature, IVs and EVs of a level {level} {enemy.name} fit the logged {stat}."))
+                continue
+            lowered, neutral, raised = spread.nature_posterior
+            parts.append(ui.p(f"{stat} nature: lowered {lowered:.0%}, neutral {neutral:.0%}, raised {raised:.0%}"))
+            plots = [ui.HTML(histogram(ivs, spread.iv_posterior, f"{stat} IV", "IV", "Probability"))]
+            if len(spread.evs) > 1:
+                plots.append(ui.HTML(histogram(spread.evs, spread.ev_posterior, f"{stat} EVs", "EVs",
+                                               "Probability")))
+            parts.append(ui.layout_columns(*plots))
+        return ui.TagList(*parts)
+
+    # species that can have the logged stats, only those of the types of the moves logged with STAB
+    @render.ui
+    @count_invalidations
+    def species_candidates():
+        logged = {stat: posterior for stat, posterior in stat_posteriors.get().items() if posterior.hits}
+        if not logged:
+            raise SilentException()
+        max_evs = min(255, int(enemy_max_evs() or 0))
+
+        parts = []
+        for stat, posterior in logged.items():
+            level = posterior.level
+            offense, probability = calc_posterior(posterior)
+            matches = rank_species(ATK if stat == "ATK" else SPA, level, offense, probability, max_evs,
+                                   posterior.stab_types)
+            if not matches:
+                parts.append(ui.p(f"No species can have this {stat} at level {level}."))
+                continue
+            rows = [(
+                species[match.species_id].name,
+                "/".join(type_priority[t] for t in species[match.species_id].types if t != NO_TYPE),
+                match.base,
+                f"{match.share:.1%}",
+            ) for match in matches[:15]]
+            parts.append(ui.h5(f"{len(matches)} species fit the logged {stat}"
+                               f"{' and the STAB types' if posterior.stab_types else ''}:"))
+            parts.append(table(["Pokemon", "Types", f"Base {stat}", "Likelihood"], rows))
+        return ui.TagList(*parts)
+
+    matrix_level = debounce(input.matrix_level)
+    matrix_stage = debounce(input.matrix_stage)
+    matrix_attack = debounce(input.matrix_attack)
+    matrix_special_attack = debounce(input.matrix_special_attack)
+    matrix_defender_level = debounce(input.matrix_defender_level)
+    matrix_iv = debounce(input.matrix_iv)
+    matrix_evs = debounce(input.matrix_evs)
+
+    @reactive.calc
+    def damage_matrix_result():
+        req(input.matrix_moves(), matrix_level(), matrix_attack(), matrix_special_attack(), matrix_defender_level())
+        attacker_types = (get_pokemon_types(pokemon_index[input.matrix_pokemon()]) if input.matrix_pokemon()
+                          else (NO_TYPE, NO_TYPE))
+        with timed("damage_matrix", moves=len(input.matrix_moves())):
+            return calc_damage_matrix([move_index[name] for name in input.matrix_moves()], int(matrix_attack()),
+                                      int(matrix_special_attack()), int(matrix_level()), attacker_types,
+                                      int(matrix_defender_level()), weather_index[input.matrix_weather()],
+                                      int(matrix_stage() or 0), min(31, int(matrix_iv() or 0)),
+                                      min(255, int(matrix_evs() or 0)), is_crit=input.matrix_crit())
+
+    # one row per defender and move, sorted and filtered on the arrays before any markup is built
+    @render.ui
+    @count_invalidations
+    def damage_matrix():
+        matrix = damage_matrix_result()
+        if not matrix.move_ids:
+            return ui.p("None of the selected moves deals damage with a fixed power.")
+        move_rows, species_rows = np.indices(matrix.ohko.shape).reshape(2, -1)
+        keep = np.ones(len(species_rows), dtype=bool)
+        if name_filter := input.matrix_filter().strip().lower():
+            keep &= np.array([name_filter in species[i].name.lower() for i in species_rows.tolist()], dtype=bool)
+        if input.matrix_type():
+            type_id = type_index[input.matrix_type()]
+            keep &= np.array([type_id in species[i].types for i in species_rows.tolist()], dtype=bool)
+        move_rows, species_rows = move_rows[keep], species_rows[keep]
+
+        max_share = matrix.damage[move_rows, species_rows, -1] / matrix.hp[species_rows]
+        numbers = np.array([species[i].number for i in species_rows.tolist()], dtype=np.int64)
+        sort_keys = {
+            "2HKO chance": (-max_share, -matrix.two_hko[move_rows, species_rows]),
+            "OHKO chance": (-max_share, -matrix.ohko[move_rows, species_rows]),
+            "Max damage": (-max_share,),
+            "Dex number": (move_rows, numbers),
+            "Name": (move_rows, np.argsort(np.argsort([species[i].name for i in species_rows.tolist()]))),
+        }
+        order = np.lexsort(sort_keys[input.matrix_sort()])[:matrix_rows]
+
+        rows = []
+        for move_row, species_row in zip(move_rows[order].tolist(), species_rows[order].tolist()):
+            damage, hp = matrix.damage[move_row, species_row], int(matrix.hp[species_row])
+            rows.append((
+                species[species_row].name,
+                "/".join(type_priority[t] for t in species[species_row].types if t != NO_TYPE),
+                moves[matrix.move_ids[move_row]].name,
+                hp,
+                f"{damage[0]}-{damage[-1]}",
+                f"{damage[0] / hp:.0%}-{damage[-1] / hp:.0%}",
+                f"{matrix.ohko[move_row, species_row]:.0%}",
+                f"{matrix.two_hko[move_row, species_row]:.0%}",
+            ))
+        return ui.TagList(
+            ui.p(f"{len(move_rows)} matchups, showing {len(rows)}."),
+            table(["Pokemon", "Types", "Move", "HP", "Damage", "% HP", "OHKO", "2HKO"], rows),
+        )
 
-    def calc_effectiveness(move_type, mon_type_1, mon_type_2):
+    planner_party = debounce(input.planner_party)
+    planner_battles = debounce(input.planner_battles)
+
+    @reactive.calc
+    def route_plan():
+        try:
+            party_levels = [int(level) for level in planner_party().replace(",", " ").split()]
+        except ValueError:
+            party_levels = []
+        if not party_levels or not all(1 <= level <= 100 for level in party_levels):
+            return "Enter the party levels as numbers from 1 to 100, e.g. 5 7 3."
+        lines = [(number, line) for number, line in enumerate(planner_battles().splitlines(), start=1)
+                 if line.strip()]
+        battles = []
+        for number, line in lines:
+            try:
+                battles.append(parse_battle(line, len(party_levels)))
+            except ValueError as error:
+                return f"Line {number}: {error}."
+        with timed("exp_planner", battles=len(battles)):
+            return party_levels, battles, plan_route(party_levels, battles)
+
+    # final levels on every growth curve, then the battle after which each level is reached on the chosen one
+    @render.ui
+    @count_invalidations
+    def exp_plan():
+        planned = route_plan()
+        if isinstance(planned, str):
+            return ui.p(planned)
+        party_levels, battles, plan = planned
+        members = [f"#{i + 1} (level {level})" for i, level in enumerate(party_levels)]
+
+        rate = growth_rates.index(input.planner_growth_rate())
+        level_ups = []
+        for member, name in enumerate(members):
+            levels = plan.levels[:, member, rate]
+            for battle in np.flatnonzero(np.diff(levels)).tolist():
+                opponent = battles[battle]
+                level_ups.append((name, f"{levels[battle]} -> {levels[battle + 1]}", battle + 1,
+                                  f"{species[opponent.species_id].name} level {opponent.level}",
+                                  f"{plan.experience[battle + 1, member, rate]:,}"))
+        return ui.TagList(
+            ui.h5(f"Levels at the end of the route ({len(battles)} battles)"),
+            table(["Party member", *growth_rates],
+                  [(name, *plan.levels[-1, member].tolist()) for member, name in enumerate(members)]),
+            ui.h5(f"Level ups, {input.planner_growth_rate()}"),
+            table(["Party member", "Level", "Battle", "Opponent", "Total EXP"], level_ups) if level_ups else
+            ui.p("Nobody levels up on this route."),
+        )
 
-        if mon_type_1 == "":
-            return 1, 1
-        elif mon_type_2 == "":
-            return types[mon_type_1][move_type], 1
-        else:
-            type_1_effectiveness = types[mon_type_1][move_type]
-            type_2_effectiveness = types[mon_type_2][move_type]
-            type_1_prio = type_priority.index(mon_type_1)
-            type_2_prio = type_priority.index(mon_type_2)
-            if type_1_prio < type_2_prio:
-                return type_1_effectiveness, type_2_effectiveness
-            else:
-                return type_2_effectiveness, type_1_effectiveness
-
-    def biv_min(level: int, current_stat: int, evs: int, nature: float):
-        return max(22, int(floor(floor(floor(current_stat / nature) - 5) * 100 / level) + (
-            0 if not (nature == 0.9 and current_stat % 10 == 0) else 100 % level) - floor(evs / 4)))
-
-    def biv_max(level: int, current_stat: int, evs: int, nature: float):
-        return min(541, int(np.floor(ceil(
-            ceil(current_stat + (0 if (nature == 1.1 and current_stat % 11 == 0) else 0.01)) / nature - (
-                5 if nature == 1 else 4)) * 100 / level) + 1 - floor(evs / 4)))
-
-    def biv_to_base_min(biv):
-        return ceil((biv - 31) / 2)
-
-    def biv_to_base_max(biv):
-        return np.floor(biv / 2)
-
-    def calc_dmg_base(level: int, move_power: int, offense: int, defense: int):
-        return floor(floor(2 * level / 5 + 2) * move_power * offense / defense)
-
-    def calc_base_power(level: int, move_power: int):
-        return floor(2 * level / 5 + 2) * move_power
-
-    def get_weather_modifier(weather, move_type):
-        if (weather == "Sunny" and move_type == "Fire") or (weather == "Rain" and move_type == "Water"):
-            return 1.5
-        elif (weather == "Sunny" and move_type == "Water") or (weather == "Rain" and move_type == "Fire"):
-            return 0.5
-        return 1
-
-    def calc_stat_stages(stat: int, stages: int):
-        return floor(stat * (2 + (stages if stages > 0 else 0)) / (2 - (stages if stages < 0 else 0)))
+    # totals of the whole process, all sessions included, refreshed every few seconds
+    @render.ui
+    def diagnostics_panel():
+        if not diagnostics.enabled:
+            raise SilentException()
+        reactive.invalidate_later(3)
+        totals = diagnostics.snapshot()
+        cache = solve_offense_cache_stats()
+
+        return ui.TagList(
+            ui.h5("Stages"),
+            table(["Stage", "Calls", "Mean ms", "Max ms", "Total ms"],
+                  [(stage, calls, f"{total / calls * 1000:.2f}", f"{slowest * 1000:.2f}", f"{total * 1000:.1f}")
+                   for stage, (calls, total, slowest) in sorted(totals["timings"].items())]),
+            ui.h5("Counters"),
+            table(["Counter", "Value"], sorted(totals["counters"].items())),
+            ui.p(f"solve_offense cache: {cache['hits']} hits, {cache['misses']} misses ({cache['hit_rate']:.0%}), "
+                 f"{cache['size']} entries in {cache['bytes'] / 2 ** 20:.1f} / {cache['max_bytes'] / 2 ** 20:.0f} MiB"),
+            ui.h5("Invalidations per output"),
+            table(["Output", "Invalidations"], sorted(totals["invalidations"].items())),
+        )
 
 
 app = App(app_ui, server)
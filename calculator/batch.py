@@ -0,0 +1,142 @@
+# Runs the Advanced calculation headless over recorded hits, one JSON/CSV row per hit, and writes one JSON line per
+# hit in input order. Rows are streamed in chunks to a process pool, at most a few chunks are in memory at a time.
+# Run from calculator/:
+#
+#     python batch.py hits.jsonl -o results.jsonl
+#     python batch.py hits.csv --workers 8 > results.jsonl
+#
+# Columns (JSON keys), only level, damage, defense and either move or power + type are required:
+#   level, damage, defense       attacker level, damage taken, own DEF/SPD before badge and stages
+#   move | power, type           move name, or power and type like the Power + Type tab
+#   pokemon | types              own species, or own types separated by "/" (neutral if neither is given)
+#   weather                      Clear, Hail, Rain, Sandstorm or Sunny
+#   defense_stage, offense_stage
+#   badge, stab, crit, burned, flash_fire, dd_charge, reflect_lightscreen, thick_fat, sport    true / false
+import argparse
+import csv
+import json
+import os
+import sys
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from engine import (calc_base_power, calc_effective_defense, calc_effectiveness, calc_modifiers, get_move_attributes,
+                    get_pokemon_types, get_weather_modifier, is_type_physical, solve_offense)
+from engine.data import NO_TYPE, STATUS, move_index, moves, pokemon_index, type_index, weather_index
+
+
+def to_bool(value) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "y")
+    return bool(value)
+
+
+def to_int(value, default: int = 0) -> int:
+    return default if value is None or value == "" else int(value)
+
+
+# the same steps as the Advanced tab: move resolution, typing, modifiers, effective defense, solve
+def solve_row(row: dict) -> dict:
+    weather_id = weather_index[row.get("weather") or "Clear"]
+    if row.get("move"):
+        move = moves[move_index[row["move"]]]
+        if move.category == STATUS:
+            raise ValueError(f"{move.name} is a status move")
+        move_type, move_power, is_physical = get_move_attributes(move.id, weather_id)
+        if not move_power:
+            raise ValueError(f"{move.name} has variable power")
+    else:
+        move_type, move_power = type_index[row["type"]], to_int(row["power"])
+        is_physical = is_type_physical(move_type)
+
+    if row.get("pokemon"):
+        type1, type2 = get_pokemon_types(pokemon_index[row["pokemon"]])
+    else:
+        types = [type_index[name] for name in (row.get("types") or "").split("/") if name] + [NO_TYPE, NO_TYPE]
+        type1, type2 = types[0], types[1]
+
+    is_crit = to_bool(row.get("crit"))
+    modifiers = calc_modifiers(
+        move_type, is_physical, calc_effectiveness(move_type, type1, type2),
+        get_weather_modifier(weather_id, move_type), offense_stage=to_int(row.get("offense_stage")),
+        is_stab=to_bool(row.get("stab")), is_crit=is_crit, is_burned=to_bool(row.get("burned")),
+        has_flash_fire=to_bool(row.get("flash_fire")), has_double_damage_or_charge=to_bool(row.get("dd_charge")),
+        has_reflect_lightscreen=to_bool(row.get("reflect_lightscreen")), has_thick_fat=to_bool(row.get("thick_fat")),
+        has_sport=to_bool(row.get("sport")),
+    )
+    defense = calc_effective_defense(to_int(row["defense"]), to_bool(row.get("badge")),
+                                     to_int(row.get("defense_stage")), is_crit)
+    offense, counts = solve_offense(to_int(row["damage"]), calc_base_power(to_int(row["level"]), move_power), defense,
+                                    modifiers)
+    return {"stat": "ATK" if is_physical else "SPA",
+            "offense_min": int(offense[0]) if len(offense) else None,
+            "offense_max": int(offense[-1]) if len(offense) else None,
+            "offense": offense.tolist(), "rolls": counts.tolist()}
+
+
+# runs in the worker processes, bad rows get an error instead of stopping the run. JSONL lines that did not parse
+# arrive as their text and get an error as well
+def solve_chunk(chunk: list[tuple[int, dict | str]]) -> list[str]:
+    lines = []
+    for number, row in chunk:
+        try:
+            if isinstance(row, str):
+                row = json.loads(row)
+            result = {"row": number, **solve_row(row)}
+        except Exception as error:
+            result = {"row": number, "error": f"{type(error).__name__}: {error}"}
+        lines.append(json.dumps(result))
+    return lines
+
+
+# JSONL lines are only parsed in solve_chunk, so a malformed line ends up as an error line in the output
+def read_rows(file, is_csv: bool):
+    if is_csv:
+        yield from csv.DictReader(file)
+    else:
+        for line in file:
+            if line.strip():
+                yield line
+
+
+def chunked(rows, size: int):
+    numbered = enumerate(rows, start=1)
+    while chunk := list(islice(numbered, size)):
+        yield chunk
+
+
+# results are written in input order as soon as the oldest chunk is done, with at most 2 * workers chunks pending
+def run(rows, out, workers: int, chunk_size: int):
+    if workers == 0:
+        for chunk in chunked(rows, chunk_size):
+            out.writelines(line + "\n" for line in solve_chunk(chunk))
+        return
+    with ProcessPoolExecutor(workers) as pool:
+        pending = deque()
+        for chunk in chunked(rows, chunk_size):
+            pending.append(pool.submit(solve_chunk, chunk))
+            if len(pending) >= 2 * workers:
+                out.writelines(line + "\n" for line in pending.popleft().result())
+        while pending:
+            out.writelines(line + "\n" for line in pending.popleft().result())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="back-calculate ATK/SPA for every hit in a JSONL or CSV file")
+    parser.add_argument("input", help="a .jsonl or .csv file, - for JSONL on stdin")
+    parser.add_argument("-o", "--output", help="write the JSON lines here instead of stdout")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes, 0 runs in-process")
+    parser.add_argument("--chunk-size", type=int, default=500)
+    args = parser.parse_args()
+
+    is_csv = args.input.endswith(".csv")
+    with (nullcontext(sys.stdin) if args.input == "-" else
+          open(args.input, newline="" if is_csv else None, encoding="utf-8")) as file, \
+            (open(args.output, "w", encoding="utf-8") if args.output else nullcontext(sys.stdout)) as out:
+        run(read_rows(file, is_csv), out, args.workers, args.chunk_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# Opt-in timings and counters for the hot paths, switched on with GEN3_CALCULATOR_DIAGNOSTICS=1. Every measurement is
+# logged as one JSON line on the "calculator.diagnostics" logger and added to per-process totals that the Diagnostics
+# tab shows. Switched off, timed() and count() do nothing and count_invalidations() returns the function unchanged
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from shiny import reactive
+
+enabled = os.environ.get("GEN3_CALCULATOR_DIAGNOSTICS", "") not in ("", "0")
+
+logger = logging.getLogger("calculator.diagnostics")
+if enabled and not logger.handlers:
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+# the solves run on a thread pool, so the totals are only touched under the lock
+lock = threading.Lock()
+# stage -> [calls, total seconds, slowest call in seconds]
+timings: dict[str, list] = {}
+counters: dict[str, int] = {}
+# output name -> number of times it was invalidated
+invalidations: dict[str, int] = {}
+
+
+def log(event: str, **fields):
+    logger.info(json.dumps({"event": event, **fields}))
+
+
+# times the block as stage. The yielded dict is logged with the timing, so the block can add what it found, e.g.
+# the number of candidates that matched
+@contextmanager
+def timed(stage: str, **fields):
+    if not enabled:
+        yield fields
+        return
+    start = time.perf_counter()
+    try:
+        yield fields
+    finally:
+        elapsed = time.perf_counter() - start
+        with lock:
+            entry = timings.setdefault(stage, [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += elapsed
+            entry[2] = max(entry[2], elapsed)
+        log("timing", stage=stage, ms=round(elapsed * 1000, 3), **fields)
+
+
+def count(counter: str, amount: int = 1):
+    if not enabled:
+        return
+    with lock:
+        counters[counter] = counters.get(counter, 0) + amount
+
+
+# for render functions, below the @render decorator: counts how often the output is invalidated and re-rendered
+def count_invalidations(function):
+    if not enabled:
+        return function
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        def invalidated():
+            with lock:
+                invalidations[function.__name__] = invalidations.get(function.__name__, 0) + 1
+            log("invalidation", output=function.__name__)
+
+        reactive.get_current_context().on_invalidate(invalidated)
+        return function(*args, **kwargs)
+
+    return wrapper
+
+
+def snapshot() -> dict:
+    with lock:
+        return {"timings": {stage: list(entry) for stage, entry in timings.items()}, "counters": dict(counters),
+                "invalidations": dict(invalidations)}
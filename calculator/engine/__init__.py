@@ -0,0 +1,44 @@
+# Gen 3 damage calculation, independent of the Shiny UI so it can be imported, batched and benchmarked on its own
+from .damage import (
+    SOLVE_CHUNK_SIZE,
+    Modifiers,
+    calc_base_power,
+    calc_damage_no_randomness,
+    calc_damage_no_randomness_batch,
+    calc_effective_defense,
+    calc_modifiers,
+    calc_offense_backwards_exact,
+    calc_offense_histogram,
+    calc_offense_solution,
+    calc_roll_counts,
+    calc_stat_stages,
+    iter_offense_histogram,
+    merge_histograms,
+    solve_offense,
+    solve_offense_cache_stats,
+    stack_modifiers,
+    trim_histogram,
+)
+from .data import (
+    ATK,
+    SPA,
+    calc_effectiveness,
+    calc_effectiveness_batch,
+    get_move_attributes,
+    get_pokemon_types,
+    get_weather_modifier,
+    is_type_physical,
+)
+from .experience import Battle, RoutePlan, calc_experience_gain, calc_level, plan_route
+from .inverse import calc_unknown_bounds, solve_unknown
+from .matrix import DamageMatrix, calc_damage_matrix
+from .observations import StatPosterior, add_observation, calc_posterior
+from .search import MoveMatch, SpeciesMatch, calc_base_range, calc_offense_bounds, rank_species, search_moves
+from .stats import (
+    StatSpread,
+    calc_hp,
+    calc_spread_joint,
+    calc_stat,
+    infer_stat_spread,
+    ivs,
+)
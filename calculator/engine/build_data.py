@@ -0,0 +1,82 @@
+# Precompiles the CSVs in data/ into data/gamedata.npz, integer-coded arrays plus small string tables that load
+# with numpy alone. Run from calculator/ after editing any CSV:
+#
+#     python engine/build_data.py
+import csv
+from pathlib import Path
+
+import numpy as np
+
+csv_dir = Path(__file__).parent.parent / "data"
+artifact_path = csv_dir / "gamedata.npz"
+
+categories = ["Physical", "Special", "Status"]
+stat_names = ["HP", "ATK", "DEF", "SPA", "SPD", "SPE"]
+
+
+def read_csv(name: str) -> list[dict]:
+    with open(csv_dir / name, newline="", encoding="utf-8") as file:
+        return list(csv.DictReader(file))
+
+
+# "-", "N/A", "Var BP", ... become 0
+def to_int(value: str) -> int:
+    value = value.replace(",", "")
+    return int(value) if value.isdigit() else 0
+
+
+def to_float(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return 0
+
+
+def build_arrays() -> dict:
+    type_rows = read_csv("type_effectiveness.csv")
+    type_names = [row["Type"] for row in type_rows]
+    type_index = {name: i for i, name in enumerate(type_names)}
+    # type_chart[move type, defending type]
+    type_chart = np.array([[float(row[name]) for name in type_names] for row in type_rows])
+
+    pokemon_rows = read_csv("pokemon.csv")
+    base_stats = {row["#"]: row for row in read_csv("base_stats.csv")}
+    move_rows = read_csv("moves.csv")
+    experience_rows = read_csv("experience_values.csv")
+    growth_rates = list(experience_rows[0].keys())[1:]
+    growth_rate_names = [rate.replace("\u00ad", "") for rate in growth_rates]
+
+    return {
+        "type_names": np.array(type_names),
+        "type_chart": type_chart,
+        "pokemon_names": np.array([row["Pokemon"] for row in pokemon_rows]),
+        "pokemon_numbers": np.array([to_int(row["#"]) for row in pokemon_rows], dtype=np.int16),
+        "pokemon_exp": np.array([to_int(row["Exp."]) for row in pokemon_rows], dtype=np.int16),
+        "pokemon_ev_yields": np.array([[to_int(row[stat]) for stat in stat_names] for row in pokemon_rows],
+                                      dtype=np.int8),
+        "pokemon_bst": np.array([to_int(row["BST"]) for row in pokemon_rows], dtype=np.int16),
+        # base_stats.csv is keyed by national dex number like pokemon.csv
+        "pokemon_base_stats": np.array([[to_int(base_stats[row["#"]][stat]) for stat in stat_names]
+                                        for row in pokemon_rows], dtype=np.int16),
+        # -1 if the Pokemon has no second type
+        "pokemon_types": np.array([[type_index.get(row["Type 1"], -1), type_index.get(row["Type 2"], -1)]
+                                   for row in pokemon_rows], dtype=np.int8),
+        "move_names": np.array([row["Name"] for row in move_rows]),
+        "move_numbers": np.array([to_int(row["#"]) for row in move_rows], dtype=np.int16),
+        # -1 for typeless moves (Struggle, Curse)
+        "move_types": np.array([type_index.get(row["Type"], -1) for row in move_rows], dtype=np.int8),
+        "move_categories": np.array([categories.index(row["Category"]) for row in move_rows], dtype=np.int8),
+        # 0 for variable power moves
+        "move_powers": np.array([to_int(row["Power"]) for row in move_rows], dtype=np.int16),
+        "move_accuracies": np.array([to_float(row["Accuracy"]) for row in move_rows]),
+        "move_pp": np.array([to_int(row["PP"]) for row in move_rows], dtype=np.int8),
+        "growth_rates": np.array(growth_rate_names),
+        # experience[level - 1] is the experience needed to go from level to level + 1, 0 at level 100
+        "experience": np.array([[to_int(row[rate]) for rate in growth_rates] for row in experience_rows],
+                               dtype=np.int32),
+    }
+
+
+if __name__ == "__main__":
+    np.savez_compressed(artifact_path, **build_arrays())
+    print(f"wrote {artifact_path}")
@@ -0,0 +1,367 @@
+import threading
+from collections import OrderedDict
+from fractions import Fraction
+from math import floor, ceil
+from typing import NamedTuple
+
+import numpy as np
+
+from .data import FIRE, ICE, ELECTRIC
+
+# the 16 random rolls of the damage formula, in percent
+ROLLS = np.arange(85, 101, dtype=np.int64)
+# received damage values covered by the inverse roll index, every value the inputs accept
+ROLL_INDEX_SIZE = 1024
+# stats are 16-bit in the game, no offense value above this exists
+MAX_STAT = (1 << 16) - 1
+
+
+# inverse roll index: row damage_received holds, for the pre-roll damages damage_received up to
+# (100 * damage_received + 99) // 85 (the only ones any roll can bring down to it), how many of the 16 rolls do.
+# The rows are stored back to back in counts, row i starts at offsets[i]. pre_roll_min / pre_roll_max are the
+# first and last pre-roll damage with a non-zero count
+class RollIndex(NamedTuple):
+    offsets: np.ndarray
+    counts: np.ndarray
+    pre_roll_min: np.ndarray
+    pre_roll_max: np.ndarray
+
+
+def build_roll_index(size: int) -> RollIndex:
+    received = np.arange(size, dtype=np.int64)
+    row_min, row_max = received, (100 * received + 99) // 85
+    offsets = np.concatenate([[0], np.cumsum(row_max - row_min + 1)])
+
+    # scatter every (pre-roll damage, roll) outcome into its row
+    pre_roll = np.repeat(np.arange(row_max[-1] + 1, dtype=np.int64), len(ROLLS))
+    rolled = pre_roll * np.tile(ROLLS, row_max[-1] + 1) // 100
+    inside = rolled < size
+    counts = np.zeros(offsets[-1], dtype=np.int8)
+    np.add.at(counts, offsets[rolled[inside]] + pre_roll[inside] - row_min[rolled[inside]], 1)
+
+    nonzero = np.flatnonzero(counts)
+    rows = np.searchsorted(offsets, nonzero, side="right") - 1
+    matching = nonzero - offsets[rows] + row_min[rows]
+    # nonzero is sorted, so the entries of a row are one run in rows, from its first index to the next row's minus one
+    filled, first = np.unique(rows, return_index=True)
+    last = np.r_[first[1:], len(rows)] - 1
+    pre_roll_min = np.full(size, -1, dtype=np.int64)
+    pre_roll_max = np.full(size, -1, dtype=np.int64)
+    pre_roll_min[filled] = matching[first]
+    pre_roll_max[filled] = matching[last]
+    return RollIndex(offsets, counts, pre_roll_min, pre_roll_max)
+
+
+roll_index = build_roll_index(ROLL_INDEX_SIZE)
+
+
+# ibm = "inside bracket modifier", the modifiers before the +2 in the formula
+# obm = "outside bracket modifier", the modifiers after the +2 in the formula
+# see https://bulbapedia.bulbagarden.net/wiki/Damage#Generation_III
+class Modifiers(NamedTuple):
+    offense_stage: int = 0
+    thick_fat: float = 1
+    sport: float = 1
+    # ibm
+    flash_fire: float = 1
+    weather: float = 1
+    reflect_lightscreen: float = 1
+    burned: float = 1
+    # obm
+    crit: int = 1
+    double_damage_charge: int = 1
+    stab: float = 1
+    effectiveness_1: float = 1
+    effectiveness_2: float = 1
+
+
+def calc_stat_stages(stat: int, stages: int) -> int:
+    return floor(stat * (2 + (stages if stages > 0 else 0)) / (2 - (stages if stages < 0 else 0)))
+
+
+def calc_defensive_stat_modifiers(stat: int, defensive_badge: bool, defensive_stage: int) -> int:
+    result = stat
+    if defensive_badge:
+        result = floor(stat * 1.1)
+    result = calc_stat_stages(result, defensive_stage)
+    return result
+
+
+# integer form of floor(2 * level / 5 + 2) * move_power, works elementwise on arrays as well
+def calc_base_power(level: int, move_power: int) -> int:
+    return (2 * level // 5 + 2) * move_power
+
+
+def calc_ibm_damage(base_damage: int, burned_modifier: float, barrier_lightscreen_modifier: float,
+                    current_weather_modifier: float, flash_fire_modifier: float) -> int:
+    result = floor(floor(
+        floor(floor(base_damage * flash_fire_modifier) * current_weather_modifier)
+        * barrier_lightscreen_modifier) * burned_modifier)
+    return result + 2
+
+
+def calc_obm_damage_no_randomness(base_damage: int, crit_modifier: int, double_damage_charge_modifier: int,
+                                  stab_modifier: float,
+                                  effectiveness_type_1: float, effectiveness_type_2: float) -> int:
+    result = floor(base_damage * crit_modifier * double_damage_charge_modifier * stab_modifier)
+    result = floor(floor(result * effectiveness_type_1) * effectiveness_type_2)
+    return result
+
+
+# damage before the random roll for a single offense value
+def calc_damage_no_randomness(offense: int, base_power: int, defense: int, modifiers: Modifiers) -> int:
+    full_damage = floor(floor(
+        base_power * calc_stat_stages(floor(floor(offense * modifiers.thick_fat) * modifiers.sport),
+                                      modifiers.offense_stage)
+        / defense) / 50)
+    full_damage = calc_ibm_damage(int(full_damage), modifiers.burned, modifiers.reflect_lightscreen,
+                                  modifiers.weather, modifiers.flash_fire)
+    return calc_obm_damage_no_randomness(full_damage, modifiers.crit, modifiers.double_damage_charge,
+                                         modifiers.stab, modifiers.effectiveness_1, modifiers.effectiveness_2)
+
+
+# all modifiers of one attack, following the Gen 3 rules for which of them apply to the move
+def calc_modifiers(move_type: int, is_physical: bool, effectiveness: tuple[float, float], weather_modifier: float,
+                   offense_stage: int = 0, is_stab: bool = False, is_crit: bool = False, is_burned: bool = False,
+                   has_flash_fire: bool = False, has_double_damage_or_charge: bool = False,
+                   has_reflect_lightscreen: bool = False, has_thick_fat: bool = False,
+                   has_sport: bool = False) -> Modifiers:
+    thick_fat_modifier = 0.5 if has_thick_fat and (move_type == ICE or move_type == FIRE) else 1
+    sport_modifier = 0.5 if has_sport and (move_type == ELECTRIC or move_type == FIRE) else 1
+    # crits ignore negative offense stages and screens
+    applied_offense_stage = 0 if (is_crit and offense_stage < 0) else offense_stage
+    return Modifiers(
+        applied_offense_stage, thick_fat_modifier, sport_modifier,
+        1.5 if (has_flash_fire and move_type == FIRE) else 1,
+        weather_modifier,
+        1 if (is_crit or not has_reflect_lightscreen) else 0.5,
+        0.5 if (is_burned and is_physical) else 1,
+        2 if is_crit else 1,
+        2 if has_double_damage_or_charge else 1,
+        1.5 if is_stab else 1,
+        effectiveness[0], effectiveness[1],
+    )
+
+
+# defense after badge and stages, crits ignore positive defense stages
+def calc_effective_defense(defense: int, has_badge: bool, defense_stage: int, is_crit: bool = False) -> int:
+    return calc_defensive_stat_modifiers(defense, has_badge, 0 if (is_crit and defense_stage > 0) else defense_stage)
+
+
+# floor(values * modifier) on integer arrays; all modifiers of the formula are
+# dyadic (0, 0.5, 1, 1.5, 2, ...) so the fraction is exact. A (numerators, denominators) pair from stack_modifiers
+# applies a different modifier to every row
+def floor_modifier(values: np.ndarray, modifier) -> np.ndarray:
+    if isinstance(modifier, tuple):
+        numerator, denominator = modifier
+        return values * numerator // denominator
+    ratio = Fraction(modifier)
+    if ratio == 1:
+        return values
+    return values * ratio.numerator // ratio.denominator
+
+
+def multiply_modifiers(*modifiers):
+    if not any(isinstance(modifier, tuple) for modifier in modifiers):
+        product = Fraction(1)
+        for modifier in modifiers:
+            product *= Fraction(modifier)
+        return product
+    numerator, denominator = 1, 1
+    for modifier in modifiers:
+        if not isinstance(modifier, tuple):
+            modifier = Fraction(modifier).as_integer_ratio()
+        numerator, denominator = numerator * modifier[0], denominator * modifier[1]
+    return numerator, denominator
+
+
+# the modifiers of many attacks as one Modifiers of column vectors, offense stages as ints and everything else as
+# (numerators, denominators), so calc_damage_no_randomness_batch evaluates all of them against a row of offense
+# values in one pass
+def stack_modifiers(modifiers: list[Modifiers]) -> Modifiers:
+    columns = [np.array([modifier.offense_stage for modifier in modifiers], dtype=np.int64)[:, None]]
+    for field in Modifiers._fields[1:]:
+        ratios = [Fraction(getattr(modifier, field)) for modifier in modifiers]
+        columns.append((np.array([ratio.numerator for ratio in ratios], dtype=np.int64)[:, None],
+                        np.array([ratio.denominator for ratio in ratios], dtype=np.int64)[:, None]))
+    return Modifiers(*columns)
+
+
+def calc_stat_stages_batch(stat: np.ndarray, stages) -> np.ndarray:
+    return stat * (2 + np.maximum(stages, 0)) // (2 - np.minimum(stages, 0))
+
+
+# damage before the random roll for every offense value at once, same steps as calc_damage_no_randomness.
+# base_power, defense and the modifiers may also be arrays that broadcast against offense, e.g. column vectors from
+# stack_modifiers give one row per attack
+def calc_damage_no_randomness_batch(offense: np.ndarray, base_power, defense,
+                                    modifiers: Modifiers) -> np.ndarray:
+    stat = floor_modifier(floor_modifier(offense, modifiers.thick_fat), modifiers.sport)
+    stat = calc_stat_stages_batch(stat, modifiers.offense_stage)
+    damage = np.asarray(base_power, dtype=np.int64) * stat // np.asarray(defense, dtype=np.int64) // 50
+
+    damage = floor_modifier(damage, modifiers.flash_fire)
+    damage = floor_modifier(damage, modifiers.weather)
+    damage = floor_modifier(damage, modifiers.reflect_lightscreen)
+    damage = floor_modifier(damage, modifiers.burned) + 2
+
+    damage = floor_modifier(damage, multiply_modifiers(modifiers.crit, modifiers.double_damage_charge,
+                                                       modifiers.stab))
+    damage = floor_modifier(floor_modifier(damage, modifiers.effectiveness_1), modifiers.effectiveness_2)
+    return damage
+
+
+# number of the 16 rolls that turn each pre-roll damage value into damage_received, for arrays of any shape.
+# A lookup in the inverse roll index, larger damage values fall back to checking every roll
+def calc_roll_counts(damage: np.ndarray, damage_received: int) -> np.ndarray:
+    if 0 <= damage_received < ROLL_INDEX_SIZE:
+        start, stop = roll_index.offsets[damage_received], roll_index.offsets[damage_received + 1]
+        index = damage - damage_received
+        inside = (index >= 0) & (index < stop - start)
+        return np.where(inside, roll_index.counts[start + np.clip(index, 0, stop - start - 1)], 0).astype(np.int64)
+
+    counts = np.zeros(damage.shape, dtype=np.int64)
+    for roll in ROLLS.tolist():
+        counts += damage * roll // 100 == damage_received
+    return counts
+
+
+# cuts a histogram down to the span from its first to its last non-zero count
+def trim_histogram(values: np.ndarray, counts: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    matched = np.flatnonzero(counts)
+    if len(matched) == 0:
+        return values[:0], counts[:0]
+    return values[matched[0]:matched[-1] + 1], counts[matched[0]:matched[-1] + 1]
+
+
+# roll-count histogram over all offense values in [offense_min, offense_max], trimmed to the values that match
+def calc_offense_histogram(offense_min: int, offense_max: int, base_power: int, defense: int,
+                           modifiers: Modifiers, damage_received: int) -> tuple[np.ndarray, np.ndarray]:
+    offense = np.arange(max(0, offense_min), offense_max + 1, dtype=np.int64)
+    counts = calc_roll_counts(calc_damage_no_randomness_batch(offense, base_power, defense, modifiers),
+                              damage_received)
+    return trim_histogram(offense, counts)
+
+
+# offense values evaluated per batch when a candidate range is scanned in pieces, bounds the memory of a solve
+SOLVE_CHUNK_SIZE = 1 << 16
+
+
+# calc_offense_histogram over [offense_min, offense_max] in pieces of chunk_size candidates, each trimmed on its own
+def iter_offense_histogram(offense_min: int, offense_max: int, base_power: int, defense: int, modifiers: Modifiers,
+                           damage_received: int, chunk_size: int = SOLVE_CHUNK_SIZE):
+    for chunk_min in range(max(0, offense_min), offense_max + 1, chunk_size):
+        yield calc_offense_histogram(chunk_min, min(offense_max, chunk_min + chunk_size - 1), base_power, defense,
+                                     modifiers, damage_received)
+
+
+# joins the pieces of iter_offense_histogram into one histogram, filling the gaps between them with 0
+def merge_histograms(parts) -> tuple[np.ndarray, np.ndarray]:
+    parts = [(offense, counts) for offense, counts in parts if len(offense)]
+    if not parts:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    first, last = int(parts[0][0][0]), int(parts[-1][0][-1])
+    counts = np.zeros(last - first + 1, dtype=np.int64)
+    for part_offense, part_counts in parts:
+        counts[part_offense[0] - first:part_offense[-1] - first + 1] = part_counts
+    return np.arange(first, last + 1, dtype=np.int64), counts
+
+
+# smallest and largest t >= 0 with lo <= floor(t * modifier) <= hi, the exact inverse of one floor step
+def invert_floor_modifier(lo: int, hi: int, modifier) -> tuple[int, int]:
+    ratio = Fraction(modifier)
+    if ratio == 0:
+        # the step always yields 0, callers only ask for intervals above 0
+        return 1, 0
+    return max(0, ceil(lo / ratio)), ceil((hi + 1) / ratio) - 1
+
+
+# smallest and largest damage before the random roll that can still roll into damage_received
+def calc_pre_roll_range(damage_received: int) -> tuple[int, int]:
+    if 0 <= damage_received < ROLL_INDEX_SIZE:
+        lo, hi = int(roll_index.pre_roll_min[damage_received]), int(roll_index.pre_roll_max[damage_received])
+        return (1, 0) if lo < 0 else (lo, hi)
+    lo = hi = None
+    for roll in range(85, 101):
+        roll_lo, roll_hi = invert_floor_modifier(damage_received, damage_received, Fraction(roll, 100))
+        if roll_lo <= roll_hi:
+            lo = roll_lo if lo is None else min(lo, roll_lo)
+            hi = roll_hi if hi is None else max(hi, roll_hi)
+    return (1, 0) if lo is None else (lo, hi)
+
+
+# exact inverse of calc_damage_no_randomness_batch: reverses every floor step of the formula, so every offense
+# value outside the returned interval is guaranteed to miss damage_received (lo > hi if nothing can match). The
+# interval ends at MAX_STAT, a weak move into a high defense would otherwise ask for millions of impossible values
+def calc_offense_backwards_exact(damage_received: int, base_power: int, defense: int,
+                                 modifiers: Modifiers) -> tuple[int, int]:
+    lo, hi = calc_pre_roll_range(damage_received)
+
+    # obm
+    for modifier in (modifiers.effectiveness_2, modifiers.effectiveness_1,
+                     Fraction(modifiers.crit) * Fraction(modifiers.double_damage_charge) * Fraction(modifiers.stab)):
+        lo, hi = invert_floor_modifier(lo, hi, modifier)
+    lo, hi = lo - 2, hi - 2
+
+    # ibm
+    for modifier in (modifiers.burned, modifiers.reflect_lightscreen, modifiers.weather, modifiers.flash_fire):
+        lo, hi = invert_floor_modifier(lo, hi, modifier)
+
+    stages = modifiers.offense_stage
+    for modifier in (Fraction(1, 50), Fraction(int(base_power), int(defense)),
+                     Fraction(2 + (stages if stages > 0 else 0), 2 - (stages if stages < 0 else 0)),
+                     modifiers.sport, modifiers.thick_fat):
+        lo, hi = invert_floor_modifier(lo, hi, modifier)
+    return lo, min(hi, MAX_STAT)
+
+
+# roll-count histogram of every offense value that can deal damage_received
+def calc_offense_solution(damage_received: int, base_power: int, defense: int,
+                          modifiers: Modifiers) -> tuple[np.ndarray, np.ndarray]:
+    offense_min, offense_max = calc_offense_backwards_exact(damage_received, base_power, defense, modifiers)
+    return merge_histograms(iter_offense_histogram(offense_min, offense_max, base_power, defense, modifiers,
+                                                   damage_received))
+
+
+# upper bound on the memory of the solve_offense cache, the counts of a full 16-bit offense range take 64 KiB
+SOLVE_CACHE_BYTES = 64 << 20
+# arguments -> (first offense value, roll counts as uint8, at most 16 rolls match), least recently used first
+solve_cache: OrderedDict = OrderedDict()
+solve_cache_totals = {"hits": 0, "misses": 0, "bytes": 0}
+solve_cache_lock = threading.Lock()
+
+
+# calc_offense_solution cached for the whole process, so every session and both tabs share the results. Level and
+# move power only enter through base_power and badge, stage and crit only through defense, so scenarios that differ
+# there but do the same math share one entry. The oldest entries are dropped once the cache holds more than
+# SOLVE_CACHE_BYTES, every caller gets arrays of its own
+def solve_offense(damage_received: int, base_power: int, defense: int,
+                  modifiers: Modifiers) -> tuple[np.ndarray, np.ndarray]:
+    key = (damage_received, base_power, defense, modifiers)
+    with solve_cache_lock:
+        entry = solve_cache.get(key)
+        if entry is not None:
+            solve_cache.move_to_end(key)
+            solve_cache_totals["hits"] += 1
+
+    if entry is None:
+        offense, counts = calc_offense_solution(damage_received, base_power, defense, modifiers)
+        entry = (int(offense[0]) if len(offense) else 0, counts.astype(np.uint8))
+        with solve_cache_lock:
+            solve_cache_totals["misses"] += 1
+            if key not in solve_cache:
+                solve_cache[key] = entry
+                solve_cache_totals["bytes"] += entry[1].nbytes
+            while solve_cache_totals["bytes"] > SOLVE_CACHE_BYTES:
+                _, (_, dropped) = solve_cache.popitem(last=False)
+                solve_cache_totals["bytes"] -= dropped.nbytes
+
+    offense_min, counts = entry
+    return np.arange(offense_min, offense_min + len(counts), dtype=np.int64), counts.astype(np.int64)
+
+
+def solve_offense_cache_stats() -> dict:
+    with solve_cache_lock:
+        hits, misses = solve_cache_totals["hits"], solve_cache_totals["misses"]
+        return {"hits": hits, "misses": misses, "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+                "size": len(solve_cache), "bytes": solve_cache_totals["bytes"], "max_bytes": SOLVE_CACHE_BYTES}
@@ -0,0 +1,157 @@
+from math import floor
+
+import numpy as np
+
+from .build_data import artifact_path, build_arrays, categories, stat_names
+
+# the precompiled artifact loads with numpy alone, the CSVs are only parsed if it has not been built yet
+if artifact_path.exists():
+    with np.load(artifact_path) as artifact:
+        arrays = {name: artifact[name] for name in artifact.files}
+else:
+    arrays = build_arrays()
+
+# types, moves, species and weather are interned as integer ids, the names are only needed at the UI boundary
+
+# the order of the types in type_effectiveness.csv is the type priority, so a lower type id means a higher priority
+type_priority = arrays["type_names"].tolist()
+type_index = {name: i for i, name in enumerate(type_priority)}
+# type_chart[move type id, defending type id]
+type_chart = arrays["type_chart"]
+
+NO_TYPE = -1
+(NORMAL, FIRE, WATER, ELECTRIC, GRASS, ICE, FIGHTING, POISON, GROUND, FLYING, PSYCHIC, BUG, ROCK, GHOST, DRAGON,
+ DARK, STEEL) = (type_index[name] for name in ["Normal", "Fire", "Water", "Electric", "Grass", "Ice", "Fighting",
+                                               "Poison", "Ground", "Flying", "Psychic", "Bug", "Rock", "Ghost",
+                                               "Dragon", "Dark", "Steel"])
+physical_types = frozenset([NORMAL, FIGHTING, POISON, GROUND, FLYING, BUG, ROCK, GHOST, STEEL])
+
+weather = [
+    "Clear",
+    "Hail",
+    "Rain",
+    "Sandstorm",
+    "Sunny",
+]
+weather_index = {name: i for i, name in enumerate(weather)}
+CLEAR, HAIL, RAIN, SANDSTORM, SUNNY = range(len(weather))
+
+PHYSICAL, SPECIAL, STATUS = range(len(categories))
+HP, ATK, DEF, SPA, SPD, SPE = range(len(stat_names))
+
+
+class Move:
+    __slots__ = ("id", "name", "type", "category", "power", "accuracy", "pp")
+
+    def __init__(self, id: int, name: str, type: int, category: int, power: int, accuracy: float, pp: int):
+        self.id = id
+        self.name = name
+        # NO_TYPE for typeless moves
+        self.type = type
+        self.category = category
+        # 0 for variable power moves
+        self.power = power
+        self.accuracy = accuracy
+        self.pp = pp
+
+
+class Species:
+    __slots__ = ("id", "name", "number", "types", "exp", "ev_yields", "bst", "base_stats")
+
+    def __init__(self, id: int, name: str, number: int, types: tuple[int, int], exp: int,
+                 ev_yields: tuple[int, ...], bst: int, base_stats: tuple[int, ...]):
+        self.id = id
+        self.name = name
+        self.number = number
+        # the second type is NO_TYPE for single-typed Pokemon
+        self.types = types
+        self.exp = exp
+        self.ev_yields = ev_yields
+        self.bst = bst
+        # HP, ATK, DEF, SPA, SPD, SPE
+        self.base_stats = base_stats
+
+
+moves = [Move(i, name, int(move_type), int(category), int(power), float(accuracy), int(pp))
+         for i, (name, move_type, category, power, accuracy, pp) in enumerate(zip(
+             arrays["move_names"].tolist(), arrays["move_types"], arrays["move_categories"],
+             arrays["move_powers"], arrays["move_accuracies"], arrays["move_pp"]))]
+move_names = [move.name for move in moves]
+move_index = {move.name: move.id for move in moves}
+WEATHER_BALL = move_index["Weather Ball"]
+SOLARBEAM = move_index["Solarbeam"]
+
+species = [Species(i, name, int(number), (int(pokemon_types[0]), int(pokemon_types[1])), int(exp),
+                   tuple(ev_yields.tolist()), int(bst), tuple(base_stats.tolist()))
+           for i, (name, number, pokemon_types, exp, ev_yields, bst, base_stats) in enumerate(zip(
+               arrays["pokemon_names"].tolist(), arrays["pokemon_numbers"], arrays["pokemon_types"],
+               arrays["pokemon_exp"], arrays["pokemon_ev_yields"], arrays["pokemon_bst"],
+               arrays["pokemon_base_stats"]))]
+pokemon_names = [pokemon.name for pokemon in species]
+pokemon_index = {pokemon.name: pokemon.id for pokemon in species}
+
+growth_rates = arrays["growth_rates"].tolist()
+experience = arrays["experience"]
+
+
+# in Gen 3 the type of a move decides whether it is physical or special
+def is_type_physical(type_id: int) -> bool:
+    return type_id in physical_types
+
+
+def get_move_attributes(move_id: int, weather_id: int) -> tuple[int, int, bool]:
+    move = moves[move_id]
+    move_power = move.power
+    move_type = move.type
+    if move_id == WEATHER_BALL:
+        if weather_id != CLEAR:
+            move_power = 100
+            if weather_id == SUNNY: move_type = FIRE
+            if weather_id == SANDSTORM: move_type = ROCK
+            if weather_id == HAIL: move_type = ICE
+            if weather_id == RAIN: move_type = WATER
+        else:
+            move_power = 50
+    elif move_id == SOLARBEAM:
+        if weather_id not in (CLEAR, SUNNY): move_power = floor(move_power / 2)
+
+    is_physical = move.category == PHYSICAL if move_type == NO_TYPE else is_type_physical(move_type)
+    return move_type, move_power, is_physical
+
+
+def get_pokemon_types(species_id: int) -> tuple[int, int]:
+    return species[species_id].types
+
+
+def calc_effectiveness(move_type: int, mon_type_1: int, mon_type_2: int) -> tuple[float, float]:
+
+    if mon_type_1 == NO_TYPE or move_type == NO_TYPE:
+        return 1, 1
+    elif mon_type_2 == NO_TYPE:
+        return float(type_chart[move_type, mon_type_1]), 1
+    else:
+        type_1_effectiveness = float(type_chart[move_type, mon_type_1])
+        type_2_effectiveness = float(type_chart[move_type, mon_type_2])
+        if mon_type_1 < mon_type_2:
+            return type_1_effectiveness, type_2_effectiveness
+        else:
+            return type_2_effectiveness, type_1_effectiveness
+
+
+# calc_effectiveness of one move against many typings at once, types[i] = (type 1, type 2) of the ith defender
+def calc_effectiveness_batch(move_type: int, types: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    if move_type == NO_TYPE:
+        return np.ones(len(types)), np.ones(len(types))
+    type_1, type_2 = types[:, 0], types[:, 1]
+    single = type_2 == NO_TYPE
+    first = np.where(single, type_1, np.minimum(type_1, type_2))
+    second = np.where(single, type_1, np.maximum(type_1, type_2))
+    return type_chart[move_type, first], np.where(single, 1.0, type_chart[move_type, second])
+
+
+def get_weather_modifier(weather_id: int, move_type: int) -> float:
+    if (weather_id == SUNNY and move_type == FIRE) or (weather_id == RAIN and move_type == WATER):
+        return 1.5
+    elif (weather_id == SUNNY and move_type == WATER) or (weather_id == RAIN and move_type == FIRE):
+        return 0.5
+    return 1
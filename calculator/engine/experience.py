@@ -0,0 +1,62 @@
+from typing import NamedTuple
+
+import numpy as np
+
+from .data import experience, growth_rates, species
+
+# base experience yield of every species, the Exp. column of pokemon.csv
+exp_yields = np.array([pokemon.exp for pokemon in species], dtype=np.int64)
+# total experience of a Pokemon that just reached a level, cumulative_experience[level - 1, growth rate]
+cumulative_experience = np.vstack([np.zeros((1, len(growth_rates)), dtype=np.int64),
+                                   np.cumsum(experience[:-1], axis=0, dtype=np.int64)])
+MAX_LEVEL = len(cumulative_experience)
+
+
+# one defeated opponent, participants are the indices of the party members that were sent out against it
+class Battle(NamedTuple):
+    species_id: int
+    level: int
+    is_trainer: bool
+    participants: tuple[int, ...]
+
+
+# total experience and level of every party member on every growth curve before the first battle (index 0) and after
+# each battle, indexed [battle, party member, growth rate]
+class RoutePlan(NamedTuple):
+    experience: np.ndarray
+    levels: np.ndarray
+
+
+# level reached with a total experience on each growth curve, a binary search in cumulative_experience. total_exp
+# broadcasts against the growth rates on its last axis
+def calc_level(total_exp: np.ndarray) -> np.ndarray:
+    total_exp = np.asarray(total_exp)
+    levels = np.empty(np.broadcast_shapes(total_exp.shape, (len(growth_rates),)), dtype=np.int64)
+    for rate in range(len(growth_rates)):
+        levels[..., rate] = np.searchsorted(cumulative_experience[:, rate], total_exp[..., rate], side="right")
+    return levels
+
+
+# experience each participant gets for a defeated opponent, the Gen 3 formula for any number of opponents at once:
+# base yield * level / 7, split between the participants, at least 1, and 1.5 times that in trainer battles
+def calc_experience_gain(species_id, level, is_trainer, participants):
+    gain = np.maximum(1, exp_yields[species_id] * level // 7 // participants)
+    return np.where(is_trainer, gain * 150 // 100, gain)
+
+
+# runs a whole route at once: the gains of all battles form a (battles, party members) matrix, its running sum gives
+# the experience after every battle and calc_level the levels on all growth curves
+def plan_route(party_levels: list[int], battles: list[Battle]) -> RoutePlan:
+    start = cumulative_experience[np.asarray(party_levels, dtype=np.int64) - 1]
+    took_part = np.zeros((len(battles), len(party_levels)), dtype=bool)
+    for i, battle in enumerate(battles):
+        took_part[i, list(battle.participants)] = True
+    gains = np.where(took_part, calc_experience_gain(
+        np.array([battle.species_id for battle in battles], dtype=np.int64),
+        np.array([battle.level for battle in battles], dtype=np.int64),
+        np.array([battle.is_trainer for battle in battles], dtype=bool),
+        np.maximum(1, took_part.sum(axis=1)))[:, None], 0)
+    gained = np.vstack([np.zeros((1, len(party_levels)), dtype=np.int64), np.cumsum(gains, axis=0)])
+    # nobody gets past level 100
+    total = np.minimum(start[None] + gained[..., None], cumulative_experience[-1])
+    return RoutePlan(total, calc_level(total))
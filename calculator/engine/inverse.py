@@ -0,0 +1,93 @@
+from typing import NamedTuple
+
+import numpy as np
+
+from .damage import (MAX_STAT, SOLVE_CHUNK_SIZE, Modifiers, calc_base_power, calc_damage_no_randomness,
+                     calc_damage_no_randomness_batch, calc_pre_roll_range, calc_roll_counts, merge_histograms,
+                     trim_histogram)
+
+
+# one input of the damage formula that can be solved for: the values searched and whether a larger value never
+# lowers the damage (offense, level, power) or never raises it (defense)
+class Unknown(NamedTuple):
+    low: int
+    high: int
+    increasing: bool
+
+
+# stats are 16-bit in the game, levels run from 1 to 100 and no move goes above 1023 power, not even Spit Up
+unknowns = {
+    "offense": Unknown(0, MAX_STAT, True),
+    "defense": Unknown(1, MAX_STAT, False),
+    "level": Unknown(1, 100, True),
+    "power": Unknown(1, 1023, True),
+}
+
+
+# damage before the random roll from the raw inputs, defense is the effective one (see calc_effective_defense)
+def calc_pre_roll_damage(offense: int, defense: int, level: int, power: int, modifiers: Modifiers) -> int:
+    return calc_damage_no_randomness(offense, calc_base_power(level, power), defense, modifiers)
+
+
+# calc_pre_roll_damage for arrays of any one (or several) of the inputs
+def calc_pre_roll_damage_batch(offense, defense, level, power, modifiers: Modifiers) -> np.ndarray:
+    return calc_damage_no_randomness_batch(np.asarray(offense, dtype=np.int64),
+                                           calc_base_power(np.asarray(level, dtype=np.int64), power), defense,
+                                           modifiers)
+
+
+# smallest value in [low, high] for which is_past holds, high + 1 if there is none. is_past has to be false up to
+# some value and true from there on, which is what the monotone damage formula gives
+def bisect_first(is_past, low: int, high: int) -> int:
+    high += 1
+    while low < high:
+        middle = (low + high) // 2
+        if is_past(middle):
+            high = middle
+        else:
+            low = middle + 1
+    return low
+
+
+# interval of the unknown that can deal damage_received: the damage is monotone in every input, so the values whose
+# pre-roll damage lies in calc_pre_roll_range form one interval and two bisections over the scalar formula find it
+def calc_unknown_bounds(unknown: str, damage_received: int, modifiers: Modifiers, known: dict) -> tuple[int, int]:
+    low, high, increasing = unknowns[unknown]
+    pre_roll_min, pre_roll_max = calc_pre_roll_range(damage_received)
+    if pre_roll_min > pre_roll_max:
+        return 1, 0
+
+    def pre_roll(value: int) -> int:
+        return calc_pre_roll_damage(**{**known, unknown: value}, modifiers=modifiers)
+
+    if increasing:
+        first = bisect_first(lambda value: pre_roll(value) >= pre_roll_min, low, high)
+        last = bisect_first(lambda value: pre_roll(value) > pre_roll_max, low, high) - 1
+    else:
+        first = bisect_first(lambda value: pre_roll(value) <= pre_roll_max, low, high)
+        last = bisect_first(lambda value: pre_roll(value) < pre_roll_min, low, high) - 1
+    return first, last
+
+
+# roll-count histogram of the one input passed as None (offense, defense, level or power) given the other three,
+# e.g. the opponent's effective DEF/SPD from damage dealt to it, a hidden level or the power of a variable power move.
+# The bounds come from calc_unknown_bounds, every value in them is then checked on the vectorized formula.
+# For the attacker's offense solve_offense is faster and cached, this is the general version of it
+def solve_unknown(damage_received: int, modifiers: Modifiers, offense: int | None = None, defense: int | None = None,
+                  level: int | None = None, power: int | None = None,
+                  chunk_size: int = SOLVE_CHUNK_SIZE) -> tuple[np.ndarray, np.ndarray]:
+    known = {"offense": offense, "defense": defense, "level": level, "power": power}
+    missing = [name for name, value in known.items() if value is None]
+    if len(missing) != 1:
+        raise ValueError(f"exactly one of {', '.join(known)} has to be unknown, got {len(missing)}")
+    unknown = missing[0]
+
+    first, last = calc_unknown_bounds(unknown, damage_received, modifiers, known)
+
+    def verify():
+        for chunk_first in range(first, last + 1, chunk_size):
+            values = np.arange(chunk_first, min(last, chunk_first + chunk_size - 1) + 1, dtype=np.int64)
+            damage = calc_pre_roll_damage_batch(**{**known, unknown: values}, modifiers=modifiers)
+            yield trim_histogram(values, calc_roll_counts(damage, damage_received))
+
+    return merge_histograms(verify())
@@ -0,0 +1,60 @@
+from typing import NamedTuple
+
+import numpy as np
+
+from .damage import ROLLS, calc_base_power, calc_damage_no_randomness_batch, calc_modifiers, stack_modifiers
+from .data import (CLEAR, DEF, HP, NO_TYPE, SPD, STATUS, calc_effectiveness_batch, get_move_attributes,
+                   get_weather_modifier, moves)
+from .search import base_stats, species_types
+from .stats import calc_hp, calc_stat
+
+
+# forward damage of an attacker's moves against every species, indexed [move, species id, roll] with the lowest
+# roll first. ohko and two_hko are the share of rolls (pairs of rolls) that take a full-HP defender out
+class DamageMatrix(NamedTuple):
+    move_ids: list[int]
+    hp: np.ndarray
+    damage: np.ndarray
+    ohko: np.ndarray
+    two_hko: np.ndarray
+
+
+# every move against every species in one broadcast over a (moves, species, rolls) array. Defenders get iv, evs and
+# nature in all stats. Status and variable power moves are left out, modifier_flags are passed on to calc_modifiers
+def calc_damage_matrix(move_ids: list[int], attack: int, special_attack: int, level: int,
+                       attacker_types: tuple[int, int], defender_level: int, weather_id: int = CLEAR,
+                       offense_stage: int = 0, iv: int = 31, evs: int = 0, nature: float = 1.0,
+                       **modifier_flags) -> DamageMatrix:
+    attacks = []
+    for move_id in move_ids:
+        if moves[move_id].category == STATUS:
+            continue
+        move_type, move_power, is_physical = get_move_attributes(move_id, weather_id)
+        if not move_power:
+            continue
+        is_stab = move_type != NO_TYPE and move_type in attacker_types
+        # the effectiveness is filled in per defender below
+        attacks.append((move_id, move_type, move_power, is_physical,
+                        calc_modifiers(move_type, is_physical, (1, 1), get_weather_modifier(weather_id, move_type),
+                                       offense_stage, is_stab, **modifier_flags)))
+
+    hp = calc_hp(base_stats[:, HP], iv, evs, defender_level)
+    if not attacks:
+        empty = np.zeros((0, len(hp)))
+        return DamageMatrix([], hp, np.zeros((0, len(hp), len(ROLLS)), dtype=np.int64), empty, empty)
+
+    is_physical = np.array([entry[3] for entry in attacks])[:, None]
+    offense = np.where(is_physical, attack, special_attack)
+    defense = calc_stat(np.where(is_physical, base_stats[:, DEF], base_stats[:, SPD]), iv, evs, defender_level, nature)
+    base_power = np.array([calc_base_power(level, entry[2]) for entry in attacks], dtype=np.int64)[:, None]
+    # type effectiveness is 0, 0.5, 1 or 2, so it is exact in halves
+    effectiveness = [calc_effectiveness_batch(entry[1], species_types) for entry in attacks]
+    modifiers = stack_modifiers([entry[4] for entry in attacks])._replace(
+        effectiveness_1=(np.rint(np.array([e[0] for e in effectiveness]) * 2).astype(np.int64), 2),
+        effectiveness_2=(np.rint(np.array([e[1] for e in effectiveness]) * 2).astype(np.int64), 2))
+
+    pre_roll = calc_damage_no_randomness_batch(offense, base_power, defense, modifiers)
+    damage = pre_roll[..., None] * ROLLS // 100
+    ohko = (damage >= hp[:, None]).mean(axis=-1)
+    two_hko = (damage[..., :, None] + damage[..., None, :] >= hp[:, None, None]).mean(axis=(-2, -1))
+    return DamageMatrix([entry[0] for entry in attacks], hp, damage, ohko, two_hko)
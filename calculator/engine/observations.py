@@ -0,0 +1,50 @@
+from typing import NamedTuple
+
+import numpy as np
+
+from .data import NO_TYPE
+
+
+# likelihood of every offense value given all hits logged so far, the product of their roll counts / 16
+# likelihood[i] belongs to the offense value offense_min + i; None until the first hit is logged. level is the
+# attacker's level in all hits, stab_types the types of the moves that were logged with STAB
+class StatPosterior(NamedTuple):
+    offense_min: int = 0
+    likelihood: np.ndarray | None = None
+    hits: tuple = ()
+    level: int = 0
+    stab_types: tuple = ()
+
+
+# multiplies one more hit into the posterior; only the overlap of both supports is touched, so earlier hits are
+# never recomputed and each hit costs O(candidates). The same attacker has a different stat at another level, so a
+# hit at a new level starts the posterior over
+def add_observation(posterior: StatPosterior, offense: np.ndarray, counts: np.ndarray, description: str, level: int,
+                    stab_type: int = NO_TYPE) -> StatPosterior:
+    if posterior.level != level:
+        posterior = StatPosterior(level=level)
+    hits = posterior.hits + (description,)
+    stab_types = posterior.stab_types
+    if stab_type != NO_TYPE and stab_type not in stab_types:
+        stab_types += (stab_type,)
+    if posterior.likelihood is None:
+        return StatPosterior(int(offense[0]) if len(offense) else 0, counts / 16, hits, level, stab_types)
+
+    offense_min = max(posterior.offense_min, int(offense[0]) if len(offense) else 0)
+    offense_max = min(posterior.offense_min + len(posterior.likelihood), int(offense[-1]) + 1 if len(offense) else 0)
+    if offense_min >= offense_max:
+        return StatPosterior(offense_min, np.zeros(0), hits, level, stab_types)
+
+    likelihood = (posterior.likelihood[offense_min - posterior.offense_min:offense_max - posterior.offense_min]
+                  * counts[offense_min - offense[0]:offense_max - offense[0]] / 16)
+    matched = np.flatnonzero(likelihood)
+    if len(matched) == 0:
+        return StatPosterior(offense_min, likelihood[:0], hits, level, stab_types)
+    return StatPosterior(offense_min + int(matched[0]), likelihood[matched[0]:matched[-1] + 1], hits, level,
+                         stab_types)
+
+
+# offense values and their normalized probabilities
+def calc_posterior(posterior: StatPosterior) -> tuple[np.ndarray, np.ndarray]:
+    offense = np.arange(posterior.offense_min, posterior.offense_min + len(posterior.likelihood))
+    return offense, posterior.likelihood / posterior.likelihood.sum()
@@ -0,0 +1,127 @@
+from typing import NamedTuple
+
+import numpy as np
+
+from .damage import (Modifiers, calc_base_power, calc_damage_no_randomness_batch, calc_modifiers, calc_roll_counts,
+                     stack_modifiers)
+from .data import NO_TYPE, STATUS, calc_effectiveness, get_move_attributes, get_weather_modifier, moves, species
+from .stats import calc_spread_joint, calc_stat
+
+# lowest and highest base ATK / SPA of Gen 3 (Chansey's ATK, Deoxys Attack Forme's ATK and SPA)
+MIN_BASE_OFFENSE, MAX_BASE_OFFENSE = 5, 180
+
+
+# every ATK / SPA value a Pokemon of this level can have
+def calc_offense_bounds(level: int) -> tuple[int, int]:
+    return (int(calc_stat(MIN_BASE_OFFENSE, 0, 0, level, 0.9)),
+            int(calc_stat(MAX_BASE_OFFENSE, 31, 255, level, 1.1)))
+
+
+# likelihood is P(damage_received | move) with the offense stat uniform over calc_offense_bounds, share the same
+# normalized over all matching moves
+class MoveMatch(NamedTuple):
+    move_id: int
+    move_type: int
+    move_power: int
+    is_physical: bool
+    is_stab: bool
+    offense_min: int
+    offense_max: int
+    likelihood: float
+    share: float
+
+
+# every damaging move with and without STAB that can deal damage_received, most likely first. All moves are
+# evaluated in one batched pass over a (moves, offense values) matrix. modifier_flags are passed on to
+# calc_modifiers, defense and special_defense are the effective DEF and SPD, physical moves hit the one and special
+# moves the other
+def search_moves(damage_received: int, level: int, defense: int, special_defense: int,
+                 defending_types: tuple[int, int], weather_id: int, offense_stage: int = 0,
+                 **modifier_flags) -> list[MoveMatch]:
+    attacks = []
+    for move in moves:
+        if move.category == STATUS:
+            continue
+        move_type, move_power, is_physical = get_move_attributes(move.id, weather_id)
+        # variable power moves
+        if not move_power:
+            continue
+        effectiveness = calc_effectiveness(move_type, *defending_types)
+        weather_modifier = get_weather_modifier(weather_id, move_type)
+        # typeless moves never get STAB
+        for is_stab in ((False,) if move_type == NO_TYPE else (False, True)):
+            attacks.append((move.id, move_type, move_power, is_physical, is_stab,
+                            calc_modifiers(move_type, is_physical, effectiveness, weather_modifier, offense_stage,
+                                           is_stab, **modifier_flags)))
+    if not attacks:
+        return []
+
+    offense_min, offense_max = calc_offense_bounds(level)
+    offense = np.arange(offense_min, offense_max + 1, dtype=np.int64)
+    base_power = np.array([calc_base_power(level, attack[2]) for attack in attacks], dtype=np.int64)[:, None]
+    is_physical = np.array([attack[3] for attack in attacks])[:, None]
+    modifiers: Modifiers = stack_modifiers([attack[5] for attack in attacks])
+    damage = calc_damage_no_randomness_batch(offense[None, :], base_power,
+                                             np.where(is_physical, defense, special_defense), modifiers)
+    counts = calc_roll_counts(damage, damage_received)
+
+    likelihood = counts.sum(axis=1) / (16 * len(offense))
+    total = likelihood.sum()
+    matches = []
+    for i in np.flatnonzero(likelihood)[np.argsort(-likelihood[likelihood > 0], kind="stable")].tolist():
+        move_id, move_type, move_power, is_physical, is_stab, _ = attacks[i]
+        matched = np.flatnonzero(counts[i])
+        matches.append(MoveMatch(move_id, move_type, move_power, is_physical, is_stab,
+                                 int(offense[matched[0]]), int(offense[matched[-1]]),
+                                 float(likelihood[i]), float(likelihood[i] / total)))
+    return matches
+
+
+base_stats = np.array([pokemon.base_stats for pokemon in species], dtype=np.int64)
+species_types = np.array([pokemon.types for pokemon in species], dtype=np.int64)
+# species ids sorted by each base stat next to the sorted base stats, so a range of base stats is one searchsorted
+# away from the species that have them
+species_by_stat = np.argsort(base_stats, axis=0, kind="stable")
+sorted_base_stats = np.take_along_axis(base_stats, species_by_stat, axis=0)
+
+
+# smallest and largest base stat that can reach a value in [stat_min, stat_max] at this level with some nature, IV
+# and up to max_evs EVs
+def calc_base_range(stat_min: int, stat_max: int, level: int, max_evs: int = 0) -> tuple[int, int]:
+    bases = np.arange(1, 256)
+    highest = calc_stat(bases, 31, max_evs, level, 1.1)
+    lowest = calc_stat(bases, 0, 0, level, 0.9)
+    return (int(bases[np.searchsorted(highest, stat_min)]) if highest[-1] >= stat_min else 256,
+            int(bases[np.searchsorted(lowest, stat_max, side="right") - 1]) if lowest[0] <= stat_max else 0)
+
+
+# evidence is P(stat distribution | species) over every nature, IV and EV spread, share the same normalized over all
+# matching species
+class SpeciesMatch(NamedTuple):
+    species_id: int
+    base: int
+    evidence: float
+    share: float
+
+
+# species whose base stat (ATK or SPA from data) can produce the stat distribution, most likely first. Only the
+# species inside the feasible base stat range are evaluated; only species that have every type in stab_types are kept
+def rank_species(stat: int, level: int, offense: np.ndarray, probability: np.ndarray, max_evs: int = 0,
+                 stab_types: tuple = ()) -> list[SpeciesMatch]:
+    if len(offense) == 0:
+        return []
+    base_min, base_max = calc_base_range(int(offense[0]), int(offense[-1]), level, max_evs)
+    start, stop = np.searchsorted(sorted_base_stats[:, stat], [base_min, base_max + 1])
+    candidates = species_by_stat[start:stop, stat]
+    for stab_type in stab_types:
+        candidates = candidates[(species_types[candidates] == stab_type).any(axis=1)]
+    if len(candidates) == 0:
+        return []
+
+    evs = np.arange(0, max_evs + 1, 4)
+    evidence = calc_spread_joint(base_stats[candidates, stat], level, offense, probability, evs).sum(axis=(1, 2, 3))
+    total = evidence.sum()
+    order = np.argsort(-evidence, kind="stable")
+    return [SpeciesMatch(int(candidates[i]), int(base_stats[candidates[i], stat]), float(evidence[i]),
+                         float(evidence[i] / total))
+            for i in order.tolist() if evidence[i] > 0]
@@ -0,0 +1,55 @@
+from typing import NamedTuple
+
+import numpy as np
+
+
+# Gen 3 formula for every stat but HP, works elementwise on arrays as well
+def calc_stat(base, iv, evs, level, nature):
+    return ((2 * base + iv + evs // 4) * level // 100 + 5) * np.rint(np.multiply(nature, 10)).astype(np.int64) // 10
+
+
+# Gen 3 HP formula, works elementwise on arrays as well. Shedinja (base HP 1) always has 1 HP
+def calc_hp(base, iv, evs, level):
+    return np.where(np.equal(base, 1), 1, (2 * np.asarray(base) + iv + evs // 4) * level // 100 + level + 10)
+
+
+natures = np.array([0.9, 1.0, 1.1])
+# 4 of the 25 natures lower a given stat, 4 raise it and 17 leave it alone
+nature_prior = np.array([4, 17, 4]) / 25
+ivs = np.arange(32)
+
+
+# posterior over the nature modifier (natures), IV (ivs) and EVs of one stat given a distribution over its value.
+# ev_posterior[i] belongs to evs[i] = 4 * i, the stat formula only sees evs // 4. evidence is P(stat distribution |
+# species), 0 if no spread reaches any of the values
+class StatSpread(NamedTuple):
+    nature_posterior: np.ndarray
+    iv_posterior: np.ndarray
+    evs: np.ndarray
+    ev_posterior: np.ndarray
+    evidence: float
+
+
+# prior-weighted P(stat distribution, nature, IV, EVs | base stat) over the nature x IV x EV grid in one broadcast.
+# natures, IVs and EVs are uniform a priori (natures weighted by how many raise or lower the stat), an array of
+# base stats adds a leading axis
+def calc_spread_joint(base, level: int, offense: np.ndarray, probability: np.ndarray, evs: np.ndarray) -> np.ndarray:
+    stat = calc_stat(np.asarray(base)[..., None, None, None], ivs[:, None], evs, level, natures[:, None, None])
+    index = stat - int(offense[0])
+    inside = (index >= 0) & (index < len(probability))
+    likelihood = np.where(inside, probability[np.clip(index, 0, len(probability) - 1)], 0)
+    return likelihood * nature_prior[:, None, None] / (len(ivs) * len(evs))
+
+
+def infer_stat_spread(base: int, level: int, offense: np.ndarray, probability: np.ndarray,
+                      max_evs: int = 0) -> StatSpread:
+    evs = np.arange(0, max_evs + 1, 4)
+    if len(offense) == 0:
+        return StatSpread(np.zeros(len(natures)), np.zeros(len(ivs)), evs, np.zeros(len(evs)), 0.0)
+    joint = calc_spread_joint(base, level, offense, probability, evs)
+
+    evidence = float(joint.sum())
+    if evidence == 0:
+        return StatSpread(np.zeros(len(natures)), np.zeros(len(ivs)), evs, np.zeros(len(evs)), 0.0)
+    joint = joint / evidence
+    return StatSpread(joint.sum(axis=(1, 2)), joint.sum(axis=(0, 2)), evs, joint.sum(axis=(0, 1)), evidence)
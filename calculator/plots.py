@@ -0,0 +1,118 @@
+import base64
+import importlib
+import io
+import os
+from html import escape
+
+import numpy as np
+
+from diagnostics import timed
+
+# "svg" draws small inline svgs, "matplotlib" the rasterized figures the calculator used to render
+plot_backend = os.environ.get("GEN3_CALCULATOR_PLOTS", "svg")
+
+roll_ticks = [0, 2, 4, 6, 8, 10, 12, 14, 16]
+# at most this many bars are drawn, wider ranges show the mean of consecutive values so rendering stays flat
+max_bars = 200
+
+width, height = 640, 400
+margin_left, margin_right, margin_top, margin_bottom = 60, 20, 40, 50
+bar_color = "#1f77b4"
+
+
+def nice_ticks(y_max: float, count: int = 5) -> list[float]:
+    step = y_max / count
+    magnitude = 10 ** np.floor(np.log10(step))
+    step = next(m * magnitude for m in (1, 2, 2.5, 5, 10) if m * magnitude >= step)
+    return [i * step for i in range(int(np.ceil(y_max / step)) + 1)]
+
+
+def format_tick(value: float) -> str:
+    return f"{value:g}" if value >= 1 or value == 0 else f"{value:.2g}"
+
+
+# histogram as a small inline svg, a few kB of markup instead of a rasterized figure
+def histogram_svg(x: np.ndarray, heights: np.ndarray, title: str, x_label: str, y_label: str,
+                  y_ticks: list[float] | None = None) -> str:
+    plot_width = width - margin_left - margin_right
+    plot_height = height - margin_top - margin_bottom
+    if y_ticks is None:
+        y_ticks = nice_ticks(float(heights.max())) if len(heights) and heights.max() > 0 else [0, 1]
+    y_max = y_ticks[-1]
+
+    def to_y(value):
+        return margin_top + plot_height * (1 - value / y_max)
+
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {width} {height}" width="100%" '
+             f'font-family="sans-serif" font-size="12">',
+             f'<text x="{width / 2}" y="{margin_top / 2 + 4}" text-anchor="middle" font-size="15">{escape(title)}'
+             f'</text>',
+             f'<text x="{margin_left + plot_width / 2}" y="{height - 8}" text-anchor="middle">{escape(x_label)}</text>',
+             f'<text transform="translate(14 {margin_top + plot_height / 2}) rotate(-90)" text-anchor="middle">'
+             f'{escape(y_label)}</text>']
+    for tick in y_ticks:
+        parts.append(f'<line x1="{margin_left - 4}" x2="{margin_left + plot_width}" y1="{to_y(tick):.1f}" '
+                     f'y2="{to_y(tick):.1f}" stroke="#ddd"/>'
+                     f'<text x="{margin_left - 8}" y="{to_y(tick) + 4:.1f}" text-anchor="end">'
+                     f'{format_tick(tick)}</text>')
+
+    if len(x) == 0:
+        parts.append(f'<text x="{margin_left + plot_width / 2}" y="{margin_top + plot_height / 2}" '
+                     f'text-anchor="middle" fill="#888">No value fits</text>')
+    else:
+        slot = plot_width / len(x)
+        for i, (value, bar_height) in enumerate(zip(x.tolist(), heights.tolist())):
+            top = to_y(bar_height)
+            parts.append(f'<rect x="{margin_left + i * slot + slot * 0.1:.2f}" y="{top:.2f}" '
+                         f'width="{slot * 0.8:.2f}" height="{margin_top + plot_height - top:.2f}" '
+                         f'fill="{bar_color}"><title>{value}: {format_tick(bar_height)}</title></rect>')
+        # label every bar for small ranges, otherwise about 10 evenly spaced values
+        label_every = max(1, int(np.ceil(len(x) / 10))) if len(x) > 20 else 1
+        for i in range(0, len(x), label_every):
+            parts.append(f'<text x="{margin_left + (i + 0.5) * slot:.2f}" y="{margin_top + plot_height + 16}" '
+                         f'text-anchor="middle">{x[i]}</text>')
+    parts.append(f'<line x1="{margin_left}" x2="{margin_left + plot_width}" y1="{margin_top + plot_height}" '
+                 f'y2="{margin_top + plot_height}" stroke="#333"/></svg>')
+    return "".join(parts)
+
+
+# matplotlib fallback, rasterized to a png data uri; the figure is closed right away so long sessions don't leak.
+# matplotlib is imported through importlib so shinylive does not bundle it for the default svg backend
+def histogram_png(x: np.ndarray, heights: np.ndarray, title: str, x_label: str, y_label: str,
+                  y_ticks: list[float] | None = None) -> str:
+    plt = importlib.import_module("matplotlib.pyplot")
+    fig, ax = plt.subplots()
+    try:
+        ax.set_title(title)
+        ax.set_ylabel(y_label)
+        ax.set_xlabel(x_label)
+        if y_ticks is not None:
+            ax.set_yticks(y_ticks, labels=[format_tick(tick) for tick in y_ticks])
+            ax.set_ylim(0, y_ticks[-1])
+        if len(x) < 21:
+            ax.set_xticks(x)
+        ax.bar(x, heights)
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format="png")
+    finally:
+        plt.close(fig)
+    return (f'<img src="data:image/png;base64,{base64.b64encode(buffer.getvalue()).decode()}" '
+            f'style="width: 100%" alt="{escape(title)}">')
+
+
+def bin_histogram(x: np.ndarray, heights: np.ndarray) -> tuple[np.ndarray, np.ndarray, int]:
+    if len(x) <= max_bars:
+        return x, heights, 1
+    width = -(-len(x) // max_bars)
+    starts = np.arange(0, len(x), width)
+    return x[starts], np.add.reduceat(heights, starts) / np.diff(np.append(starts, len(x))), width
+
+
+def histogram(x: np.ndarray, heights: np.ndarray, title: str, x_label: str, y_label: str,
+              y_ticks: list[float] | None = None) -> str:
+    with timed("render_plot", backend=plot_backend, values=len(x)):
+        x, heights, width = bin_histogram(x, heights)
+        if width > 1:
+            x_label = f"{x_label} (mean of {width} values per bar)"
+        render = histogram_png if plot_backend == "matplotlib" else histogram_svg
+        return render(x, heights, title, x_label, y_label, y_ticks)